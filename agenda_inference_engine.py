@@ -0,0 +1,49 @@
+from inference_engine import InferenceEngine
+
+# Facts that no forward-chaining rule reads or writes.
+IGNORED_FACTS = {"glitter", "Scream", "AllWumpusesKilled", "Visited"}
+
+class AgendaInferenceEngine(InferenceEngine):
+    # Same rules as InferenceEngine, but a fact change only queues the rule
+    # instances whose premises or conclusions mention that cell or its
+    # neighbours, so a step costs O(changed cells) instead of O(N^2).
+    def __init__(self, knowledge_base):
+        super().__init__(knowledge_base)
+        self.cell_rules = [
+            self.safecombination_at,
+            self.eliminate_possible_pit_at,
+            self.eliminate_possible_wumpus_at,
+            self.confirm_pit_at,
+            self.confirm_wumpus_at,
+        ]
+        self.agenda = [set() for _ in self.cell_rules]
+
+        # Facts already in the knowledge base have never been looked at.
+        all_cells = [(x, y) for x in range(self.kb.N) for y in range(self.kb.N)]
+        for pending in self.agenda:
+            pending.update(all_cells)
+
+        self.kb.add_listener(self.on_fact_changed)
+
+    def on_fact_changed(self, name, x, y, added):
+        if name in IGNORED_FACTS or not (0 <= x < self.kb.N and 0 <= y < self.kb.N):
+            return
+        # safecombination only looks at its own cell; the conflict and
+        # confirm rules also look at (or write to) the four neighbours.
+        self.agenda[0].add((x, y))
+        cells = self.kb.get_adjacent(x, y) + ((x, y),)
+        for pending in self.agenda[1:]:
+            pending.update(cells)
+
+    def logic_inference_forward_chaining(self):
+        # One round applies each rule, in the same order as the full sweep,
+        # to the cells queued for it; anything a rule changes is queued for
+        # the next round.
+        while any(self.agenda):
+            for i, rule in enumerate(self.cell_rules):
+                pending = self.agenda[i]
+                if not pending:
+                    continue
+                self.agenda[i] = set()
+                for x, y in pending:
+                    rule(x, y)
@@ -1,11 +1,18 @@
-from const import DIRECTIONS, DX, DY
 from collections import deque
+from const import DIRECTIONS, STENCH, BREEZE, GLITTER, SCREAM, pack_percepts
 from knowledge_base import KnowledgeBase
 from inference_engine import InferenceEngine
 from planning_module import PlanningModule
+from probability_engine import ProbabilityEngine
+from topology import DIRECTION_INDEX
 
 class Agent:
-    def __init__(self, N, K=2):
+    # Messages go through log; a Simulator points it at its observers, or
+    # sets it to None so a run without observers prints nothing.
+    log = print
+
+    def __init__(self, N, K=2, kb_class=KnowledgeBase, inference_class=InferenceEngine,
+                 lazy_inference=False, pit_prior=None, planner_class=PlanningModule):
         self.N = N
         self.K = K  # Number of wumpuses
         self.wumpuses_killed = 0  # Track killed wumpuses
@@ -16,9 +23,16 @@ class Agent:
         self.current_y = 0
         self.current_dir = 'E'
         
-        self.kb = KnowledgeBase(N)
-        self.inference_engine = InferenceEngine(self.kb)
-        self.planning_module = PlanningModule(self.kb, N)
+        self.kb = kb_class(N)
+        self.inference_engine = inference_class(self.kb)
+        # Lazy mode skips forward chaining and lets the planner prove the
+        # facts it actually asks about by backward chaining.
+        self.lazy_inference = lazy_inference
+        self.beliefs = self.inference_engine.query_view() if lazy_inference else self.kb
+        # With the generator's pit density the planner uses exact hazard
+        # probabilities instead of its fixed risk levels.
+        self.probability_engine = ProbabilityEngine(self.kb, K, pit_prior) if pit_prior is not None else None
+        self.planning_module = planner_class(self.beliefs, N, self.probability_engine)
         
         self.score = 0
 
@@ -29,68 +43,84 @@ class Agent:
 
     def Agent_get_percepts(self, percept):
         x, y = percept["position"]
-        direction = percept["direction"]
-        
+        self.perceive(x, y, DIRECTION_INDEX[percept["direction"]], pack_percepts(percept))
+
+    def perceive(self, x, y, direction, bits):
+        # direction is a direction code and bits the packed percept.
+        direction = DIRECTIONS[direction]
         self.update_position(x, y, direction)
+
+        if self.lazy_inference and bits & SCREAM:
+            # The arrow handlers edit stored facts, so they have to start
+            # from what eager mode holds here: last step's fixpoint plus
+            # this step's percept rules. Materialise that fixpoint first.
+            self.inference_engine.logic_inference_forward_chaining()
         
-        self.kb.visited.add((x, y))
+        self.kb.mark_visited(x, y)
 
-        self.kb.add_fact("Safe", x, y)
-        self.kb.add_fact("SafePit", x, y)
-        self.kb.add_fact("SafeWumpus", x, y)
+        # Observed directly, so these stay even if a derivation of them is
+        # later retracted.
+        self.inference_engine.assert_fact("Safe", x, y)
+        self.inference_engine.assert_fact("SafePit", x, y)
+        self.inference_engine.assert_fact("SafeWumpus", x, y)
 
-        if percept.get("breeze"):
+        if bits & BREEZE:
             self.kb.add_fact("Breeze", x, y)
             self.inference_engine.rule_breeze_possible_pit(x, y)
         else:
             self.kb.add_fact("NoBreeze", x, y)
             self.inference_engine.rule_no_breeze(x, y)
 
-        if percept.get("stench"):
+        if bits & STENCH:
             self.kb.add_fact("Stench", x, y)
             self.inference_engine.rule_stench_possible_wumpus(x, y)
         else:
             self.kb.add_fact("NoStench", x, y)
             self.inference_engine.rule_no_stench(x, y)
 
-        if percept.get("glitter"):
+        if bits & GLITTER:
             self.kb.add_fact("glitter", x, y)
 
-        if percept.get("scream"):
+        if bits & SCREAM:
             self.kb.add_fact("Scream", x, y)
             self.wumpuses_killed += 1
-            print(f"Wumpus killed! Total wumpuses killed: {self.wumpuses_killed}/{self.K}")
-            
+            self.inference_engine.wumpus_killed()
+            if self.probability_engine is not None:
+                self.probability_engine.wumpus_killed()
+            if self.log:
+                self.log(f"Wumpus killed! Total wumpuses killed: {self.wumpuses_killed}/{self.K}")
+
             if self.wumpuses_killed >= self.K:
-                print("All wumpuses have been killed! No more wumpus threats.")
-                self.kb.add_fact("AllWumpusesKilled")
+                if self.log:
+                    self.log("All wumpuses have been killed! No more wumpus threats.")
+                self.kb.add_fact("AllWumpusesKilled", 0, 0)
                 self.inference_engine.handle_all_wumpuses_killed()
             
             self.inference_engine.handle_shoot(x, y, direction)
+            if self.lazy_inference:
+                # Settle the handlers' edits as eager mode does, so later
+                # queries start from the same stored facts.
+                self.inference_engine.logic_inference_forward_chaining()
 
-        if percept.get("bump"):
-            pass
-            
-        self.inference_engine.logic_inference_forward_chaining()
+        self.run_inference()
+
+    def run_inference(self):
+        if not self.lazy_inference:
+            self.inference_engine.logic_inference_forward_chaining()
 
 
     def handle_shoot(self, agent_x, agent_y, agent_dir):
-        dx, dy = DX[agent_dir], DY[agent_dir]
-        x, y = agent_x + dx, agent_y + dy
+        target = self.kb.fire_lines.first("suspect", agent_x, agent_y, agent_dir)
+        if target is None:
+            return
+        x, y = target
+        self.kb.remove_fact("Wumpus", x, y)
+        self.kb.remove_fact("PossibleWumpus", x, y)
+        self.kb.add_fact("SafeWumpus", x, y)
         
-        while 0 <= x < self.N and 0 <= y < self.N:
-            if self.kb.fact_exists("Wumpus", x, y) or self.kb.fact_exists("PossibleWumpus", x, y):
-                self.kb.remove_fact("Wumpus", x, y)
-                self.kb.remove_fact("PossibleWumpus", x, y)
-                self.kb.add_fact("SafeWumpus", x, y)
-                
-                for nx, ny in self.kb.get_adjacent(x, y):
-                    if self.kb.fact_exists("Stench", nx, ny):
-                        self.kb.remove_fact("Stench", nx, ny)
-                
-                break
-            x += dx
-            y += dy
+        for nx, ny in self.kb.get_adjacent(x, y):
+            if self.kb.fact_exists("Stench", nx, ny):
+                self.kb.remove_fact("Stench", nx, ny)
 
     def print_agent_map(self, width, height, agent_x, agent_y):
         for y in reversed(range(height)):
@@ -100,15 +130,15 @@ class Agent:
 
                 if (x, y) == (agent_x, agent_y):
                     cell_symbols.append("A")
-                if self.kb.fact_exists("Safe", x, y):
+                if self.beliefs.fact_exists("Safe", x, y):
                     cell_symbols.append("V")
-                if self.kb.fact_exists("Pit", x, y):
+                if self.beliefs.fact_exists("Pit", x, y):
                     cell_symbols.append("P!")
-                if self.kb.fact_exists("Wumpus", x, y):
+                if self.beliefs.fact_exists("Wumpus", x, y):
                     cell_symbols.append("W!")
-                if self.kb.fact_exists("PossiblePit", x, y):
+                if self.beliefs.fact_exists("PossiblePit", x, y):
                     cell_symbols.append("P?")
-                if self.kb.fact_exists("PossibleWumpus", x, y):
+                if self.beliefs.fact_exists("PossibleWumpus", x, y):
                     cell_symbols.append("W?")
                 if not cell_symbols:
                     cell_symbols.append(".")
@@ -128,6 +158,8 @@ class Agent:
     def find_path_to_target(self, start_x, start_y, target_x, target_y):
         if (target_x, target_y) not in self.kb.visited and not self.kb.fact_exists("Safe", target_x, target_y):
             return None
+        if not self.kb.same_safe_region((start_x, start_y), (target_x, target_y)):
+            return None
             
         queue = deque([(start_x, start_y, [])])
         visited = set()
@@ -149,28 +181,19 @@ class Agent:
         return None
 
     def should_shoot_wumpus(self, agent_x, agent_y, agent_dir):
-        dx, dy = DX[agent_dir], DY[agent_dir]
-        x, y = agent_x + dx, agent_y + dy
-        
-        while 0 <= x < self.N and 0 <= y < self.N:
-            if self.kb.fact_exists("Wumpus", x, y):
-                return True
-            
-            if self.kb.fact_exists("Safe", x, y) and (x, y) in self.kb.visited:
-                break
-            x += dx
-            y += dy
-        return False
+        return self.kb.wumpus_in_line(agent_x, agent_y, agent_dir)
 
     def grab_gold_action(self):
         x, y = self.current_x, self.current_y
         if self.kb.fact_exists("glitter", x, y):
-            print("Gold grabbed!")
+            if self.log:
+                self.log("Gold grabbed!")
             self.has_gold = True
             self.score += 10  
             return True
         else:
-            print("No gold to grab here!")
+            if self.log:
+                self.log("No gold to grab here!")
             return False
 
     def climb_action(self):
@@ -204,53 +227,52 @@ class Agent:
         return self.score
 
     def choose_action(self):
-        self.inference_engine.logic_inference_forward_chaining()
+        self.run_inference()
         
-        agent_x, agent_y = self.current_x, self.current_y
-        adjacent_info = []
-        for direction in DIRECTIONS:
-            dx, dy = DX[direction], DY[direction]
-            nx, ny = agent_x + dx, agent_y + dy
-            if 0 <= nx < self.N and 0 <= ny < self.N:
+        if self.log:
+            agent_x, agent_y = self.current_x, self.current_y
+            adjacent_info = []
+            for direction, nx, ny in self.kb.topology.moves(agent_x, agent_y):
                 status = []
-                if self.kb.fact_exists("Safe", nx, ny):
+                if self.beliefs.fact_exists("Safe", nx, ny):
                     status.append("Safe")
-                if self.kb.fact_exists("PossiblePit", nx, ny):
+                if self.beliefs.fact_exists("PossiblePit", nx, ny):
                     status.append("P?")
-                if self.kb.fact_exists("PossibleWumpus", nx, ny):
+                if self.beliefs.fact_exists("PossibleWumpus", nx, ny):
                     status.append("W?")
-                if self.kb.fact_exists("Pit", nx, ny):
+                if self.beliefs.fact_exists("Pit", nx, ny):
                     status.append("PIT!")
-                if self.kb.fact_exists("Wumpus", nx, ny):
+                if self.beliefs.fact_exists("Wumpus", nx, ny):
                     status.append("WUMPUS!")
                 if (nx, ny) in self.kb.visited:
                     status.append("Visited")
                 if not status:
                     status.append("Unknown")
-                
+            
                 adjacent_info.append(f"{direction}:({nx},{ny})={'/'.join(status)}")
         
-        print(f"Adjacent cells: {' | '.join(adjacent_info)}")
+            self.log(f"Adjacent cells: {' | '.join(adjacent_info)}")
         
         current_score = self.currentScore()
-        action = self.planning_module.plan_optimal_action(
+        action = self.planning_module.next_action(
             self.current_x, self.current_y, self.current_dir, 
             self.has_gold, self.shoot, current_score
         )
         
-        current_score = self.currentScore()
-        score_change = ""
-        if action == "FORWARD":
-            score_change = " (-1)"
-        elif action in ["LEFT", "RIGHT"]:
-            score_change = " (-1)"
-        elif action == "SHOOT":
-            score_change = " (-10)"
-        elif action == "GRAB":
-            score_change = " (+10)"
-        elif action == "CLIMB":
-            score_change = f" ({'+1000' if self.has_gold else '+0'})"
+        if self.log:
+            current_score = self.currentScore()
+            score_change = ""
+            if action == "FORWARD":
+                score_change = " (-1)"
+            elif action in ["LEFT", "RIGHT"]:
+                score_change = " (-1)"
+            elif action == "SHOOT":
+                score_change = " (-10)"
+            elif action == "GRAB":
+                score_change = " (+10)"
+            elif action == "CLIMB":
+                score_change = f" ({'+1000' if self.has_gold else '+0'})"
         
-        print(f"Action: {action}{score_change} | Score: {current_score} | Gold: {self.has_gold} | Pos: ({self.current_x},{self.current_y})")
+            self.log(f"Action: {action}{score_change} | Score: {current_score} | Gold: {self.has_gold} | Pos: ({self.current_x},{self.current_y})")
         
         return action
@@ -0,0 +1,549 @@
+from inference_engine import InferenceEngine
+
+# Sort key that puts true literals first and false ones last.
+RANK = {True: 0, None: 1, False: 2}
+
+class WatchedLiteralSolver:
+    # Incremental clause database with two-watched-literal unit propagation,
+    # native "at most k of these variables" constraints and a bounded DPLL
+    # check. Variables are positive ints, literals are +var / -var. Clauses
+    # are added and removed at decision level 0 and every check returns
+    # there. Each assignment keeps its reason: the id of the clause that
+    # implied it, ("limit", j) for a full at-most constraint, or None for a
+    # decision.
+    def __init__(self):
+        self.clauses = []
+        self.watches = {}
+        self.value = {}
+        self.reason = {}
+        self.trail = []
+        self.trail_lim = []
+        self.head = 0
+        self.limits = []
+        self.true_counts = []
+        self.limits_of_var = {}
+        self.limit_vars = []
+        self.inconsistent = False
+        # Clauses not known to be satisfied. A clause leaves the set when
+        # one of its watched literals becomes true; the ones closed above
+        # level 0 are logged so backtracking reopens them.
+        self.open = set()
+        self.closed = []
+        self.closed_lim = []
+        # Reasons of the implications and conflicts met by the last search.
+        self.used = set()
+        # Clause ids per variable, and the variables whose clauses changed
+        # (a new clause or a level-0 assignment) since the caller last took
+        # them.
+        self.occurs = {}
+        self.touched = set()
+
+    def lit_value(self, lit):
+        v = self.value.get(abs(lit))
+        if v is None:
+            return None
+        return v if lit > 0 else not v
+
+    def enqueue(self, lit, reason=None):
+        current = self.lit_value(lit)
+        if current is True:
+            return True
+        if self.trail_lim and reason is not None:
+            self.used.add(reason)
+        if current is False:
+            return False
+        var = abs(lit)
+        self.value[var] = lit > 0
+        self.reason[var] = reason
+        self.trail.append(lit)
+        if not self.trail_lim:
+            self.touched.add(var)
+        for cid in self.watches.get(lit, ()):
+            self.close(cid)
+        if lit > 0:
+            for j in self.limits_of_var.get(var, ()):
+                self.true_counts[j] += 1
+                if self.true_counts[j] > self.limits[j]:
+                    if self.trail_lim:
+                        self.used.add(("limit", j))
+                    return False
+        return True
+
+    def close(self, cid):
+        if cid in self.open:
+            self.open.discard(cid)
+            if self.trail_lim:
+                self.closed.append(cid)
+
+    def propagate(self):
+        while self.head < len(self.trail):
+            lit = self.trail[self.head]
+            self.head += 1
+
+            if lit > 0:
+                for j in self.limits_of_var.get(lit, ()):
+                    if self.true_counts[j] == self.limits[j] and not self.saturate(j):
+                        return False
+
+            false_lit = -lit
+            watching = self.watches.get(false_lit)
+            if not watching:
+                continue
+            i = 0
+            while i < len(watching):
+                cid = watching[i]
+                clause = self.clauses[cid]
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], clause[0]
+                if self.lit_value(clause[0]) is True:
+                    i += 1
+                    continue
+                for k in range(2, len(clause)):
+                    value = self.lit_value(clause[k])
+                    if value is not False:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        self.watches.setdefault(clause[1], []).append(cid)
+                        watching[i] = watching[-1]
+                        watching.pop()
+                        if value:
+                            self.close(cid)
+                        break
+                else:
+                    if not self.enqueue(clause[0], cid):
+                        return False
+                    i += 1
+        return True
+
+    def saturate(self, j):
+        # A full at-most constraint makes its other variables false.
+        for other in self.limit_vars[j]:
+            if self.value.get(other) is None and not self.enqueue(-other, ("limit", j)):
+                return False
+        return True
+
+    def attach(self, cid):
+        # Watch a true literal if there is one, else the free ones, and
+        # enqueue the last free literal of a clause that became unit.
+        clause = self.clauses[cid]
+        clause.sort(key=lambda lit: RANK[self.lit_value(lit)])
+        first = self.lit_value(clause[0]) if clause else False
+        if first is False:
+            self.inconsistent = True
+            return
+        if len(clause) == 1:
+            self.enqueue(clause[0], cid)
+            return
+        if first is None:
+            self.open.add(cid)
+        self.watches.setdefault(clause[0], []).append(cid)
+        self.watches.setdefault(clause[1], []).append(cid)
+        if first is None and self.lit_value(clause[1]) is False:
+            self.enqueue(clause[0], cid)
+
+    def detach(self, cid):
+        clause = self.clauses[cid]
+        if len(clause) > 1:
+            self.watches[clause[0]].remove(cid)
+            self.watches[clause[1]].remove(cid)
+        self.open.discard(cid)
+
+    def add_clause(self, lits):
+        # Returns the clause id, which stays valid until the clause is
+        # removed.
+        if self.inconsistent:
+            return None
+        cid = len(self.clauses)
+        clause = list(dict.fromkeys(lits))
+        self.clauses.append(clause)
+        for lit in clause:
+            self.occurs.setdefault(abs(lit), []).append(cid)
+            self.touched.add(abs(lit))
+        self.attach(cid)
+        if not self.inconsistent and not self.propagate():
+            self.inconsistent = True
+        return cid
+
+    def add_at_most(self, variables, limit):
+        j = len(self.limits)
+        self.limits.append(limit)
+        self.limit_vars.append(list(variables))
+        self.true_counts.append(sum(1 for v in variables if self.value.get(v) is True))
+        for v in variables:
+            self.limits_of_var.setdefault(v, []).append(j)
+        self.set_limit(j, limit)
+
+    def set_limit(self, j, limit):
+        # Limits only shrink, so what the old one implied still holds.
+        self.limits[j] = limit
+        self.touched.update(v for v in self.limit_vars[j] if v in self.occurs)
+        if self.true_counts[j] > limit:
+            self.inconsistent = True
+        elif self.true_counts[j] == limit:
+            if not (self.saturate(j) and self.propagate()):
+                self.inconsistent = True
+
+    def remove_clauses(self, cids):
+        # Drops the clauses and undoes the level-0 assignments that relied on
+        # them, directly or through other undone assignments, then restores
+        # the watches of the clauses that lost an assignment. Returns the
+        # undone variables.
+        removed = set(cids)
+        for cid in removed:
+            self.detach(cid)
+            for lit in self.clauses[cid]:
+                self.occurs[abs(lit)].remove(cid)
+                self.touched.add(abs(lit))
+            self.clauses[cid] = None
+
+        undone = set()
+        dirty_limits = set()
+        kept = []
+        for lit in self.trail:
+            var = abs(lit)
+            reason = self.reason[var]
+            if isinstance(reason, int):
+                stale = reason in removed or any(
+                    abs(other) in undone for other in self.clauses[reason] if other != lit)
+            else:
+                stale = reason[1] in dirty_limits
+            if not stale:
+                kept.append(lit)
+                continue
+            undone.add(var)
+            del self.value[var]
+            del self.reason[var]
+            if lit > 0:
+                for j in self.limits_of_var.get(var, ()):
+                    self.true_counts[j] -= 1
+                    dirty_limits.add(j)
+        if not undone:
+            return undone
+        self.trail = kept
+        self.head = len(kept)
+        self.touched.update(undone)
+
+        stale_clauses = sorted({cid for var in undone for cid in self.occurs.get(var, ())})
+        for cid in stale_clauses:
+            self.detach(cid)
+        for cid in stale_clauses:
+            self.attach(cid)
+        for j in sorted(dirty_limits):
+            if self.true_counts[j] == self.limits[j]:
+                self.saturate(j)
+        if not self.propagate():
+            self.inconsistent = True
+        return undone
+
+    def backtrack(self, level):
+        if len(self.trail_lim) <= level:
+            return
+        stop = self.trail_lim[level]
+        for lit in self.trail[stop:]:
+            var = abs(lit)
+            del self.value[var]
+            del self.reason[var]
+            if lit > 0:
+                for j in self.limits_of_var.get(var, ()):
+                    self.true_counts[j] -= 1
+        del self.trail[stop:]
+        del self.trail_lim[level:]
+        self.head = len(self.trail)
+        self.open.update(self.closed[self.closed_lim[level]:])
+        del self.closed[self.closed_lim[level]:]
+        del self.closed_lim[level:]
+
+    def decide(self, lit):
+        self.trail_lim.append(len(self.trail))
+        self.closed_lim.append(len(self.closed))
+        return self.enqueue(lit) and self.propagate()
+
+    def branch_literal(self):
+        # An open clause may still be satisfied by a literal it does not
+        # watch, so check before branching on it.
+        for cid in self.open:
+            free = None
+            for lit in self.clauses[cid]:
+                value = self.lit_value(lit)
+                if value is True:
+                    break
+                if value is None and free is None:
+                    free = lit
+            else:
+                if free is not None:
+                    return free
+        return None
+
+    def trivially_satisfiable(self):
+        # Making every free variable of an open clause true satisfies all
+        # clauses; it is a model if no at-most constraint overflows.
+        free = set()
+        for cid in self.open:
+            clause = self.clauses[cid]
+            if any(self.lit_value(lit) is True for lit in clause):
+                continue
+            free.update(abs(lit) for lit in clause if self.lit_value(lit) is None)
+        extra = [0] * len(self.limits)
+        for var in free:
+            for j in self.limits_of_var.get(var, ()):
+                extra[j] += 1
+        return all(self.true_counts[j] + extra[j] <= self.limits[j] for j in range(len(self.limits)))
+
+    def satisfiable_with(self, assumption, max_decisions):
+        # True / False, or None when the decision budget runs out. With
+        # every clause satisfied, the remaining variables can all be false
+        # without breaking an at-most constraint.
+        if self.inconsistent:
+            return None
+        self.used = set()
+        try:
+            if not self.decide(assumption):
+                return False
+            decisions = []
+            budget = max_decisions
+            while True:
+                if self.trivially_satisfiable():
+                    return True
+                lit = self.branch_literal()
+                if lit is None:
+                    return True
+                if budget == 0:
+                    return None
+                budget -= 1
+                decisions.append([lit, False])
+                ok = self.decide(lit)
+                while not ok:
+                    while decisions and decisions[-1][1]:
+                        decisions.pop()
+                    if not decisions:
+                        return False
+                    level = len(decisions)
+                    self.backtrack(level)
+                    decisions[-1][1] = True
+                    ok = self.decide(-decisions[-1][0])
+        finally:
+            self.backtrack(0)
+
+
+class CNFInferenceEngine(InferenceEngine):
+    # Encodes percepts as clauses over Pit/Wumpus variables and draws what
+    # they entail in addition to the hand-written rules: a breeze is
+    # "OR of Pit on the neighbours", a calm visited cell forbids pits next
+    # to it, and (when wumpus_count is given) at most that many wumpuses
+    # are alive. A cell is provably safe when assuming the hazard there
+    # is unsatisfiable within max_decisions DPLL decisions.
+    def __init__(self, knowledge_base, wumpus_count=None, max_decisions=64):
+        super().__init__(knowledge_base)
+        self.wumpus_count = wumpus_count
+        self.max_decisions = max_decisions
+        self.wumpuses_killed = 0
+        self.rebuild(keep_stench=True)
+
+    def pit_var(self, x, y):
+        return y * self.kb.N + x + 1
+
+    def wumpus_var(self, x, y):
+        return self.kb.N * self.kb.N + y * self.kb.N + x + 1
+
+    def cell_of(self, var):
+        i = (var - 1) % (self.kb.N * self.kb.N)
+        return i % self.kb.N, i // self.kb.N
+
+    def fact_of(self, lit):
+        # The fact that a level-0 assignment is synced to.
+        x, y = self.cell_of(abs(lit))
+        is_pit = abs(lit) <= self.kb.N * self.kb.N
+        if lit > 0:
+            return ("Pit" if is_pit else "Wumpus", x, y)
+        return ("SafePit" if is_pit else "SafeWumpus", x, y)
+
+    def rebuild(self, keep_stench):
+        self.solver = WatchedLiteralSolver()
+        self.encoded = set()
+        # Antecedent facts per clause id, the stench clauses (a kill may
+        # silence any of them) and the units learned from the search.
+        self.sources = {}
+        self.stench_clauses = []
+        self.learned = []
+        self.synced = 0
+        self.update_wumpus_limit()
+        for x, y in list(self.kb.visited):
+            self.encode_visited(x, y)
+        for x, y in list(self.kb.iter_facts_of("NoBreeze")):
+            self.encode_percept("NoBreeze", x, y)
+        for x, y in list(self.kb.iter_facts_of("Breeze")):
+            self.encode_percept("Breeze", x, y)
+        for x, y in list(self.kb.iter_facts_of("NoStench")):
+            self.encode_percept("NoStench", x, y)
+        if keep_stench:
+            for x, y in list(self.kb.iter_facts_of("Stench")):
+                self.encode_percept("Stench", x, y)
+
+    def update_wumpus_limit(self):
+        if self.wumpus_count is None:
+            return
+        limit = max(self.wumpus_count - self.wumpuses_killed, 0)
+        if self.solver.limits:
+            self.solver.set_limit(0, limit)
+        else:
+            cells = [(x, y) for y in range(self.kb.N) for x in range(self.kb.N)]
+            self.solver.add_at_most([self.wumpus_var(x, y) for x, y in cells], limit)
+
+    def add_clause(self, lits, *antecedents):
+        cid = self.solver.add_clause(lits)
+        if cid is not None:
+            self.sources[cid] = antecedents
+        return cid
+
+    def encode_visited(self, x, y):
+        if ("visited", x, y) in self.encoded:
+            return
+        self.encoded.add(("visited", x, y))
+        self.add_clause([-self.pit_var(x, y)])
+        self.add_clause([-self.wumpus_var(x, y)])
+
+    def encode_percept(self, name, x, y):
+        if (name, x, y) in self.encoded:
+            return
+        self.encoded.add((name, x, y))
+        var_of = self.pit_var if name in ("Breeze", "NoBreeze") else self.wumpus_var
+        neighbors = [var_of(nx, ny) for nx, ny in self.kb.get_adjacent(x, y)]
+        if name in ("Breeze", "Stench"):
+            cid = self.add_clause(neighbors, (name, x, y))
+            if name == "Stench" and cid is not None:
+                self.stench_clauses.append(cid)
+        else:
+            for var in neighbors:
+                self.add_clause([-var], (name, x, y))
+
+    def rule_no_breeze(self, x, y):
+        self.encode_visited(x, y)
+        self.encode_percept("NoBreeze", x, y)
+        return super().rule_no_breeze(x, y)
+
+    def rule_breeze_possible_pit(self, x, y):
+        self.encode_visited(x, y)
+        self.encode_percept("Breeze", x, y)
+        return super().rule_breeze_possible_pit(x, y)
+
+    def rule_no_stench(self, x, y):
+        self.encode_percept("NoStench", x, y)
+        return super().rule_no_stench(x, y)
+
+    def rule_stench_possible_wumpus(self, x, y):
+        self.encode_percept("Stench", x, y)
+        return super().rule_stench_possible_wumpus(x, y)
+
+    def wumpus_killed(self):
+        self.wumpuses_killed += 1
+
+    def forget_stench(self):
+        # Arrows invalidate stench clauses (the stench may come from the
+        # wumpus that died), so after a kill only stenches perceived again
+        # are encoded. The units learned from the search may rest on them
+        # too; the solver undoes whatever followed from the dropped clauses.
+        if self.solver.inconsistent:
+            self.rebuild(keep_stench=False)
+            return
+        for cid in self.stench_clauses:
+            self.encoded.discard(self.sources[cid][0])
+        stale = self.stench_clauses + self.learned
+        self.stench_clauses = []
+        self.learned = []
+        synced = self.solver.trail[:self.synced]
+        undone = self.solver.remove_clauses(stale)
+        for cid in stale:
+            del self.sources[cid]
+        self.synced = sum(1 for lit in synced if abs(lit) not in undone)
+        self.update_wumpus_limit()
+
+    def handle_shoot(self, agent_x, agent_y, agent_dir):
+        super().handle_shoot(agent_x, agent_y, agent_dir)
+        self.forget_stench()
+
+    def handle_all_wumpuses_killed(self):
+        super().handle_all_wumpuses_killed()
+        self.wumpus_count = 0
+        self.forget_stench()
+
+    def check_undecided(self):
+        # Try to settle the free variables of the open clauses that share a
+        # variable with what changed since the last check.
+        solver = self.solver
+        if not solver.touched or solver.inconsistent:
+            return
+        candidates = set()
+        seen = set()
+        touched, solver.touched = solver.touched, set()
+        for var in touched:
+            for cid in solver.occurs.get(var, ()):
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                clause = solver.clauses[cid]
+                if any(solver.lit_value(lit) is True for lit in clause):
+                    continue
+                candidates.update(abs(lit) for lit in clause if solver.lit_value(lit) is None)
+        for var in sorted(candidates):
+            if solver.value.get(var) is not None:
+                continue
+            if solver.satisfiable_with(var, self.max_decisions) is False:
+                self.learn(-var)
+            elif solver.satisfiable_with(-var, self.max_decisions) is False:
+                self.learn(var)
+
+    def learn(self, lit):
+        # The refutation only used the clauses and constraints in
+        # solver.used, under the level-0 assignments their literals had.
+        solver = self.solver
+        antecedents = set()
+        for reason in solver.used:
+            if isinstance(reason, int):
+                antecedents.update(self.sources[reason])
+                antecedents.update(self.fact_of(-other) for other in solver.clauses[reason]
+                                   if solver.lit_value(other) is False)
+            else:
+                antecedents.update(self.limit_antecedents(reason[1]))
+        cid = self.add_clause([lit], *sorted(antecedents))
+        if cid is not None:
+            self.learned.append(cid)
+
+    def limit_antecedents(self, j):
+        solver = self.solver
+        return tuple(self.fact_of(v) for v in solver.limit_vars[j] if solver.value.get(v) is True)
+
+    def justification(self, lit, limits):
+        # The clause that implied the assignment, or the wumpuses that fill
+        # the at-most constraint; limits caches the latter per constraint.
+        reason = self.solver.reason[abs(lit)]
+        if isinstance(reason, int):
+            return self.sources[reason] + tuple(
+                self.fact_of(-other) for other in self.solver.clauses[reason] if other != lit)
+        j = reason[1]
+        if j not in limits:
+            limits[j] = self.limit_antecedents(j)
+        return limits[j]
+
+    def apply_clause_deductions(self):
+        self.check_undecided()
+        changed = False
+        trail = self.solver.trail
+        limits = {}
+        for lit in trail[self.synced:]:
+            name, x, y = self.fact_of(lit)
+            if lit < 0:
+                if not self.kb.fact_exists("Pit" if name == "SafePit" else "Wumpus", x, y):
+                    if self.conclude(name, x, y, *self.justification(lit, limits)):
+                        changed = True
+            else:
+                if self.conclude(name, x, y, *self.justification(lit, limits)):
+                    changed = True
+                if self.kb.remove_fact("Possible" + name, x, y):
+                    changed = True
+        self.synced = len(trail)
+        return changed
+
+    def logic_inference_forward_chaining(self):
+        while True:
+            super().logic_inference_forward_chaining()
+            if self.solver.inconsistent or not self.apply_clause_deductions():
+                break
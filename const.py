@@ -1,3 +1,36 @@
 DIRECTIONS = ['N', 'E', 'S', 'W']
 DX = {'N': 0, 'E': 1, 'S': 0, 'W': -1}
-DY = {'N': 1, 'E': 0, 'S': -1, 'W': 0}
\ No newline at end of file
+DY = {'N': 1, 'E': 0, 'S': -1, 'W': 0}
+
+# Integer codes used by the simulator loop. A direction's code is its index
+# in DIRECTIONS; the string names stay for printing and for the planner.
+NORTH, EAST, SOUTH, WEST = range(4)
+STEP_X = (0, 1, 0, -1)
+STEP_Y = (1, 0, -1, 0)
+
+FORWARD, LEFT, RIGHT, GRAB, SHOOT, CLIMB = range(6)
+ACTIONS = ('FORWARD', 'LEFT', 'RIGHT', 'GRAB', 'SHOOT', 'CLIMB')
+ACTION_CODE = {name: code for code, name in enumerate(ACTIONS)}
+
+# Percept bits, packed into one int per step.
+STENCH = 1
+BREEZE = 2
+GLITTER = 4
+BUMP = 8
+SCREAM = 16
+PERCEPT_NAMES = (("stench", STENCH), ("breeze", BREEZE), ("glitter", GLITTER),
+                 ("bump", BUMP), ("scream", SCREAM))
+
+def pack_percepts(percept):
+    bits = 0
+    for name, bit in PERCEPT_NAMES:
+        if percept.get(name):
+            bits |= bit
+    return bits
+
+def unpack_percepts(x, y, direction, bits):
+    # The dict form of a percept, for code that still reads it by name.
+    percept = {"position": (x, y), "direction": DIRECTIONS[direction]}
+    for name, bit in PERCEPT_NAMES:
+        percept[name] = bits & bit != 0
+    return percept
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from typing import List, Optional, Set, Tuple
+
+class DecisionCache:
+    # LRU memo of the planner's local exploration moves. The move only
+    # depends on the facing direction and, for each neighbour, its flags
+    # below, so those make the key. Each cell's flags are packed into a
+    # code that is recomputed only when a fact close enough to change it
+    # does, so building a key reads four codes instead of asking the
+    # knowledge base. Flags that cannot matter (anything but VISITED on a
+    # visited cell, say) are left out of a code.
+    VISITED = 1
+    SAFE = 2
+    POSSIBLE_PIT = 4
+    POSSIBLE_WUMPUS = 8
+    PIT = 16
+    WUMPUS = 32
+    # No breeze or stench next to the cell.
+    CALM = 64
+
+    MISS = object()
+
+    def __init__(self, planner, capacity: int):
+        self.planner = planner
+        self.kb = planner.kb
+        self.N = planner.N
+        self.capacity = capacity
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.codes: List[Optional[int]] = [None] * (self.N * self.N)
+        self.changed_cells: Set[Tuple[int, int]] = set()
+        self.kb.add_listener(self.on_fact_changed)
+
+    def on_fact_changed(self, name: str, x: int, y: int, added: bool) -> None:
+        self.changed_cells.add((x, y))
+
+    def cell_code(self, x: int, y: int) -> int:
+        i = y * self.N + x
+        code = self.codes[i]
+        if code is None:
+            # Only the flags the decision can still depend on are read.
+            kb = self.kb
+            if (x, y) in kb.visited:
+                code = self.VISITED
+            else:
+                code = 0
+                for flag, name in ((self.SAFE, "Safe"), (self.POSSIBLE_PIT, "PossiblePit"),
+                                   (self.POSSIBLE_WUMPUS, "PossibleWumpus")):
+                    if kb.fact_exists(name, x, y):
+                        code |= flag
+                if not code & (self.POSSIBLE_PIT | self.POSSIBLE_WUMPUS):
+                    for flag, name in ((self.PIT, "Pit"), (self.WUMPUS, "Wumpus")):
+                        if kb.fact_exists(name, x, y):
+                            code |= flag
+                    if not code & (self.PIT | self.WUMPUS) and not any(
+                            kb.fact_exists("Breeze", ax, ay) or kb.fact_exists("Stench", ax, ay)
+                            for ax, ay in kb.get_adjacent(x, y)):
+                        code |= self.CALM
+            self.codes[i] = code
+        return code
+
+    def key(self, x: int, y: int, direction: str) -> Tuple:
+        if self.changed_cells:
+            for cx, cy in self.planner.affected_cells(self.changed_cells):
+                self.codes[cy * self.N + cx] = None
+            self.changed_cells.clear()
+        codes = [direction]
+        for nx, ny in ((x, y + 1), (x + 1, y), (x, y - 1), (x - 1, y)):
+            if 0 <= nx < self.N and 0 <= ny < self.N:
+                codes.append(self.cell_code(nx, ny))
+            else:
+                codes.append(-1)
+        return tuple(codes)
+
+    def lookup(self, key: Tuple):
+        action = self.entries.get(key, self.MISS)
+        if action is self.MISS:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return action
+
+    def store(self, key: Tuple, action: Optional[str]) -> None:
+        self.entries[key] = action
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
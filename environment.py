@@ -1,18 +1,29 @@
 import random
-from const import DIRECTIONS, DX, DY
-class Cell:
-    def __init__(self):
-        self.wumpus = False
-        self.pit = False
-        self.gold = False
+from const import (DIRECTIONS, EAST, STEP_X, STEP_Y, STENCH, BREEZE, GLITTER, BUMP, SCREAM,
+                   unpack_percepts)
+from topology import DIRECTION_INDEX
+# Bit flags of a cell in Environment.cells.
+PIT = 1
+WUMPUS = 2
+GOLD = 4
 
 class Environment:
+    # The world is one bytearray of cell flags, indexed by y * N + x, with
+    # the number of pits and wumpuses next to each cell kept alongside so a
+    # percept is two lookups. Neighbours come from coordinate arithmetic, so
+    # a world costs about 3 bytes a cell. Messages go through log, which a
+    # Simulator points at its observers (None silences them).
+    log = print
+
     def __init__(self, N=8, K=2, p=0.2):
         self.N = N
-        self.grid = [[Cell() for _ in range(N)] for _ in range(N)]
+        self.cells = bytearray(N * N)
+        self.breeze = bytearray(N * N)
+        self.stench = bytearray(N * N)
         self.agent_x = 0
         self.agent_y = 0
-        self.agent_dir = 'E'
+        # Facing as a direction code; agent_dir gives the name.
+        self.dir = EAST
         self.scream = False
         self.bump = False
         self.has_gold = False
@@ -20,66 +31,118 @@ class Environment:
         self.place_pits(p)
         self.place_wumpus(K)
         self.place_gold()
-
+        self.build_percept_maps()
+
+    def has(self, x, y, flag):
+        return self.cells[y * self.N + x] & flag != 0
+
+    def set_flag(self, x, y, flag, present):
+        # Pits and wumpuses also update the counts of their neighbours.
+        i = y * self.N + x
+        if bool(self.cells[i] & flag) == present:
+            return
+        if present:
+            self.cells[i] |= flag
+        else:
+            self.cells[i] &= ~flag
+        counts = self.breeze if flag == PIT else self.stench if flag == WUMPUS else None
+        if counts is not None:
+            step = 1 if present else -1
+            for nx, ny in self.get_adjacent(x, y):
+                counts[ny * self.N + nx] += step
+
+    def build_percept_maps(self):
+        N = self.N
+        for i, cell in enumerate(self.cells):
+            if not cell & (PIT | WUMPUS):
+                continue
+            y, x = divmod(i, N)
+            for nx, ny in self.get_adjacent(x, y):
+                if cell & PIT:
+                    self.breeze[ny * N + nx] += 1
+                if cell & WUMPUS:
+                    self.stench[ny * N + nx] += 1
+
+    def count(self, flag):
+        return sum(1 for cell in self.cells if cell & flag)
+
+    def load_world(self, other):
+        # Play on a copy of another environment's world.
+        self.cells = bytearray(other.cells)
+        self.breeze = bytearray(other.breeze)
+        self.stench = bytearray(other.stench)
+
+    # The generators only set flags; build_percept_maps counts neighbours
+    # once they are done.
     def place_pits(self, p):
         for y in range(self.N):
             for x in range(self.N):
                 if (x, y) != (0, 0) and random.random() < p:
-                    self.grid[y][x].pit = True
+                    self.cells[y * self.N + x] |= PIT
 
     def place_wumpus(self, K):
         count = 0
         while count < K:
             x = random.randint(0, self.N - 1)
             y = random.randint(0, self.N - 1)
-            if not self.grid[y][x].pit and not self.grid[y][x].wumpus and (x, y) != (0, 0):
-                self.grid[y][x].wumpus = True
+            if not self.has(x, y, PIT | WUMPUS) and (x, y) != (0, 0):
+                self.cells[y * self.N + x] |= WUMPUS
                 count += 1
 
     def place_gold(self):
         while True:
             x = random.randint(0, self.N - 1)
             y = random.randint(0, self.N - 1)
-            if not self.grid[y][x].pit and not self.grid[y][x].wumpus:
-                self.grid[y][x].gold = True
+            if not self.has(x, y, PIT | WUMPUS):
+                self.cells[y * self.N + x] |= GOLD
                 break
 
+    @property
+    def agent_dir(self):
+        return DIRECTIONS[self.dir]
+
+    @agent_dir.setter
+    def agent_dir(self, direction):
+        self.dir = DIRECTION_INDEX[direction]
+
     def get_adjacent(self, x, y):
-        neighbors = []
-        for d in ['N', 'E', 'S', 'W']:
-            nx, ny = x + DX[d], y + DY[d]
-            if 0 <= nx < self.N and 0 <= ny < self.N:
-                neighbors.append((nx, ny))
-        return neighbors
-    
-    def env_get_percepts(self):
-        x, y = self.agent_x, self.agent_y
-        percept = {
-            "position": (x, y),
-            "direction": self.agent_dir ,
-            "stench": any(self.grid[ny][nx].wumpus for (nx, ny) in self.get_adjacent(x, y)),
-            "breeze": any(self.grid[ny][nx].pit for (nx, ny) in self.get_adjacent(x, y)),
-            "glitter": self.grid[y][x].gold,
-            "bump": self.bump,
-            "scream": self.scream,
-        }
+        N = self.N
+        return [(x + dx, y + dy) for dx, dy in zip(STEP_X, STEP_Y)
+                if 0 <= x + dx < N and 0 <= y + dy < N]
+
+    def percept_bits(self):
+        i = self.agent_y * self.N + self.agent_x
+        bits = 0
+        if self.stench[i]:
+            bits |= STENCH
+        if self.breeze[i]:
+            bits |= BREEZE
+        if self.cells[i] & GOLD:
+            bits |= GLITTER
+        if self.bump:
+            bits |= BUMP
+        if self.scream:
+            bits |= SCREAM
         self.scream = False
         self.bump = False
-        return percept
+        return bits
+
+    def env_get_percepts(self):
+        return unpack_percepts(self.agent_x, self.agent_y, self.dir, self.percept_bits())
 
     def check_die(self):
-        cell = self.grid[self.agent_y][self.agent_x]
-        if cell.wumpus:
-            print("YOU DIED! Reason: Eaten by Wumpus!")
+        if self.has(self.agent_x, self.agent_y, WUMPUS):
+            if self.log:
+                self.log("YOU DIED! Reason: Eaten by Wumpus!")
             return True
-        elif cell.pit:
-            print("YOU DIED! Reason: Fell into a pit!")
+        elif self.has(self.agent_x, self.agent_y, PIT):
+            if self.log:
+                self.log("YOU DIED! Reason: Fell into a pit!")
             return True
         return False
 
     def move_forward(self):
-        dx, dy = DX[self.agent_dir], DY[self.agent_dir]
-        nx, ny = self.agent_x + dx, self.agent_y + dy
+        nx, ny = self.agent_x + STEP_X[self.dir], self.agent_y + STEP_Y[self.dir]
         if 0 <= nx < self.N and 0 <= ny < self.N:
             self.agent_x, self.agent_y = nx, ny
             died = self.check_die()
@@ -89,59 +152,57 @@ class Environment:
 
 
     def turn_left(self):
-        idx = DIRECTIONS.index(self.agent_dir)
-        self.agent_dir = DIRECTIONS[(idx - 1) % 4]
+        self.dir = (self.dir - 1) & 3
 
 
     def turn_right(self):
-        idx = DIRECTIONS.index(self.agent_dir)
-        self.agent_dir = DIRECTIONS[(idx + 1) % 4]
+        self.dir = (self.dir + 1) & 3
    
 
     def shoot(self):
-        dx, dy = DX[self.agent_dir], DY[self.agent_dir]
+        dx, dy = STEP_X[self.dir], STEP_Y[self.dir]
         x, y = self.agent_x + dx, self.agent_y + dy
-        
         while 0 <= x < self.N and 0 <= y < self.N:
-            if self.grid[y][x].wumpus:
-                self.grid[y][x].wumpus = False
+            if self.has(x, y, WUMPUS):
+                self.set_flag(x, y, WUMPUS, False)
                 self.scream = True
                 return
-            x += dx
-            y += dy
+            x, y = x + dx, y + dy
         
         self.scream = False
 
     def grab_gold(self):
-        if self.grid[self.agent_y][self.agent_x].gold:
-            self.grid[self.agent_y][self.agent_x].gold = False
+        if self.has(self.agent_x, self.agent_y, GOLD):
+            self.set_flag(self.agent_x, self.agent_y, GOLD, False)
             self.has_gold = True
             return True
         return False
 
     def climb(self):
         if self.agent_x == 0 and self.agent_y == 0 and self.has_gold:
-            print("SUCCESS! Agent climbed out with the gold! Mission accomplished!")
+            if self.log:
+                self.log("SUCCESS! Agent climbed out with the gold! Mission accomplished!")
             return True
         elif self.agent_x == 0 and self.agent_y == 0:
-            print("You climbed out but you don't have the gold!")
+            if self.log:
+                self.log("You climbed out but you don't have the gold!")
             return True
         else:
-            print("Can only climb at starting position (0,0)!")
+            if self.log:
+                self.log("Can only climb at starting position (0,0)!")
             return False
 
     def print_map(self):
         for j in range(self.N - 1, -1, -1):
             for i in range(self.N):
-                c = self.grid[j][i]
                 symbol = '.'
                 if self.agent_x == i and self.agent_y == j:
                     symbol = 'A'
-                elif c.gold:
+                elif self.has(i, j, GOLD):
                     symbol = 'G'
-                elif c.wumpus:
+                elif self.has(i, j, WUMPUS):
                     symbol = 'W'
-                elif c.pit:
+                elif self.has(i, j, PIT):
                     symbol = 'P'
                 print(symbol, end='  ')
             print()
@@ -0,0 +1,179 @@
+import time
+from const import DX, DY
+from topology import LEFT_OF, RIGHT_OF
+from typing import Dict, FrozenSet, Optional, Tuple
+from planning_module import PlanningModule
+
+class SearchBudgetExceeded(Exception):
+    pass
+
+class ExpectimaxPlanner(PlanningModule):
+    # Chooses exploration moves by expectimax over FORWARD/LEFT/RIGHT/CLIMB.
+    # Stepping into an unvisited cell is a chance node: the agent dies with
+    # the cell's hazard probability; otherwise it perceives neither breeze
+    # nor stench with the probability that no neighbour holds a hazard (and
+    # then every neighbour is known safe), and it finds the gold there with
+    # probability 1 / (expected number of gold-free unvisited cells left).
+    # Hazard probabilities come from the probability engine when there is
+    # one, else from calculate_cell_risk / 1000; a breeze or stench does
+    # not re-condition them.
+    #
+    # Iterative deepening runs until node_budget nodes have been expanded
+    # (or max_depth is reached) and plays the best action of the deepest
+    # completed search. The budget counts nodes rather than seconds, so the
+    # same beliefs always give the same move on any machine; time_budget
+    # adds a wall-clock deadline per step on top of it, trading that
+    # determinism for a bound on latency. Values are
+    # kept in a transposition table keyed by agent state, the cells entered
+    # and cleared on the way and the remaining depth, and dropped whenever
+    # the knowledge base changes.
+    GOLD_REWARD = 1000.0
+    GRAB_REWARD = 10.0
+    DEATH_PENALTY = 1000.0
+
+    def __init__(self, knowledge_base, N, probability_engine=None, node_budget: Optional[int] = 2000,
+                 max_depth: int = 12, time_budget: Optional[float] = None):
+        super().__init__(knowledge_base, N, probability_engine)
+        self.node_budget = node_budget
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.table: Dict[Tuple, float] = {}
+        self.death: Optional[Dict[Tuple[int, int], float]] = None
+        self.nodes_left: Optional[int] = None
+        self.deadline: Optional[float] = None
+        self.kb.add_listener(self.on_fact_changed)
+
+    def on_fact_changed(self, name, x, y, added):
+        if self.table:
+            self.table.clear()
+        self.death = None
+
+    def refresh_beliefs(self):
+        if self.death is not None:
+            return
+        self.death = {}
+        for y in range(self.N):
+            for x in range(self.N):
+                if (x, y) in self.kb.visited:
+                    continue
+                if self.probability_engine is not None:
+                    self.death[(x, y)] = self.probability_engine.death_probability(x, y)
+                else:
+                    self.death[(x, y)] = min(self.calculate_cell_risk(x, y) / 1000.0, 1.0)
+        # Expected number of unvisited cells that could hold the gold.
+        self.gold_cells = sum(1.0 - d for d in self.death.values())
+        self.safe_unvisited = [cell for cell, d in self.death.items() if d == 0.0]
+
+    def hazard(self, cell: Tuple[int, int], cleared: FrozenSet[Tuple[int, int]]) -> float:
+        return 0.0 if cell in cleared else self.death[cell]
+
+    def calm_chance(self, x: int, y: int, cleared: FrozenSet[Tuple[int, int]]) -> float:
+        chance = 1.0
+        for cell in self.kb.get_adjacent(x, y):
+            if cell not in self.kb.visited:
+                chance *= 1.0 - self.hazard(cell, cleared)
+        return chance
+
+    def gold_chance(self, entered: FrozenSet[Tuple[int, int]]) -> float:
+        remaining = self.gold_cells - sum(1.0 - self.death[cell] for cell in entered)
+        return 1.0 / remaining if remaining > 1.0 else 1.0
+
+    def leaf_value(self, x: int, y: int, has_gold: bool, entered: FrozenSet[Tuple[int, int]],
+                   cleared: FrozenSet[Tuple[int, int]]) -> float:
+        # Walk home (optimistically), or first walk to the nearest known-safe
+        # cell that has not been looked at yet.
+        home = -(x + y)
+        if has_gold:
+            return self.GOLD_REWARD + home
+        best = home
+        chance = self.gold_chance(entered)
+        for cx, cy in self.safe_unvisited + list(cleared):
+            if (cx, cy) in entered:
+                continue
+            distance = abs(cx - x) + abs(cy - y)
+            best = max(best, chance * self.GOLD_REWARD - distance - cx - cy)
+        return best
+
+    def value(self, x: int, y: int, direction: str, has_gold: bool, entered: FrozenSet[Tuple[int, int]],
+              cleared: FrozenSet[Tuple[int, int]], depth: int) -> float:
+        if depth == 0:
+            return self.leaf_value(x, y, has_gold, entered, cleared)
+        key = (x, y, direction, has_gold, entered, cleared, depth)
+        cached = self.table.get(key)
+        if cached is not None:
+            return cached
+        if self.nodes_left is not None:
+            self.nodes_left -= 1
+            if self.nodes_left < 0:
+                raise SearchBudgetExceeded()
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchBudgetExceeded()
+
+        best = max(v for _, v in self.action_values(x, y, direction, has_gold, entered, cleared, depth))
+        self.table[key] = best
+        return best
+
+    def action_values(self, x: int, y: int, direction: str, has_gold: bool, entered: FrozenSet[Tuple[int, int]],
+                      cleared: FrozenSet[Tuple[int, int]], depth: int):
+        for action in ("FORWARD", "LEFT", "RIGHT", "CLIMB"):
+            if action == "CLIMB":
+                if x == 0 and y == 0:
+                    yield action, (self.GOLD_REWARD if has_gold else 0.0)
+            elif action in ("LEFT", "RIGHT"):
+                turned = RIGHT_OF[direction] if action == "RIGHT" else LEFT_OF[direction]
+                yield action, -1.0 + self.value(x, y, turned, has_gold, entered, cleared, depth - 1)
+            else:
+                nx, ny = x + DX[direction], y + DY[direction]
+                if not (0 <= nx < self.N and 0 <= ny < self.N):
+                    continue
+                if (nx, ny) in self.kb.visited or (nx, ny) in entered:
+                    yield action, -1.0 + self.value(nx, ny, direction, has_gold, entered, cleared, depth - 1)
+                    continue
+                death = self.hazard((nx, ny), cleared)
+                if death >= 1.0:
+                    continue
+                inside = entered | {(nx, ny)}
+                calm = self.calm_chance(nx, ny, cleared)
+                calm_cleared = cleared | {cell for cell in self.kb.get_adjacent(nx, ny) if cell not in self.kb.visited}
+                survive = 0.0
+                for chance_of, now_cleared in ((calm, calm_cleared), (1.0 - calm, cleared)):
+                    if chance_of == 0.0:
+                        continue
+                    if has_gold:
+                        outcome = self.value(nx, ny, direction, True, inside, now_cleared, depth - 1)
+                    else:
+                        gold = self.gold_chance(entered)
+                        outcome = ((1.0 - gold) * self.value(nx, ny, direction, False, inside, now_cleared, depth - 1)
+                                   + gold * (self.GRAB_REWARD
+                                             + self.value(nx, ny, direction, True, inside, now_cleared, depth - 1)))
+                    survive += chance_of * outcome
+                yield action, -1.0 - death * self.DEATH_PENALTY + (1.0 - death) * survive
+
+    def search(self, agent_x: int, agent_y: int, agent_dir: str, has_gold: bool) -> Optional[str]:
+        if self.time_budget is not None:
+            self.deadline = time.perf_counter() + self.time_budget
+        self.refresh_beliefs()
+        self.nodes_left = self.node_budget
+        best_action = None
+        try:
+            for depth in range(1, self.max_depth + 1):
+                scored = list(self.action_values(agent_x, agent_y, agent_dir, has_gold, frozenset(), frozenset(), depth))
+                if scored:
+                    best_action = max(scored, key=lambda item: item[1])[0]
+        except SearchBudgetExceeded:
+            pass
+        finally:
+            self.nodes_left = None
+            self.deadline = None
+        return best_action
+
+    def plan_optimal_action(self, agent_x: int, agent_y: int, agent_dir: str,
+                            has_gold: bool, has_shot: bool, current_score: int = 0) -> str:
+        # Going home with the gold, grabbing and shooting stay rule-based.
+        if has_gold or self.kb.fact_exists("glitter", agent_x, agent_y) or \
+                self.should_shoot(agent_x, agent_y, agent_dir, has_shot):
+            return super().plan_optimal_action(agent_x, agent_y, agent_dir, has_gold, has_shot, current_score)
+        action = self.search(agent_x, agent_y, agent_dir, has_gold)
+        if action is None:
+            return super().plan_optimal_action(agent_x, agent_y, agent_dir, has_gold, has_shot, current_score)
+        return action
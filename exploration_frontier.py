@@ -0,0 +1,98 @@
+import heapq
+from typing import List, Optional, Set, Tuple
+from home_distance_field import HomeDistanceField
+
+class FrontierDistanceField(HomeDistanceField):
+    # Cost from every (x, y, dir) state to the nearest safe frontier cell,
+    # through known-safe cells, kept by the same Lifelong Planning A* as
+    # the home field with every state of a frontier cell as a goal. Its
+    # queue survives between steps: a fact change re-prices the cells it
+    # can affect, a cell joining or leaving the frontier re-seeds its four
+    # states, and only what those touch is re-expanded. The agent moves
+    # every step, so distances are kept to the frontier rather than from
+    # the agent; the agent reads its own and follows the gradient.
+    def __init__(self, frontier):
+        self.frontier = frontier
+        self.goal = bytearray(frontier.N * frontier.N)
+        super().__init__(frontier.planner, avoid_dangerous=False)
+
+    def seed_goals(self) -> None:
+        self.frontier.refresh()
+        for x, y in self.frontier.safe:
+            self.goal[y * self.N + x] = 1
+            for d in range(4):
+                state = (y * self.N + x) * 4 + d
+                self.rhs[state] = 0.0
+                heapq.heappush(self.queue, (0.0, state))
+
+    def is_goal(self, state: int) -> bool:
+        return self.goal[state >> 2] == 1
+
+    def entry_cost(self, x: int, y: int) -> float:
+        kb = self.planner.kb
+        if (x, y) in kb.visited or kb.fact_exists("Safe", x, y):
+            return self.planner.entry_cost(x, y)
+        return float('inf')
+
+    def refresh(self) -> None:
+        frontier = self.frontier
+        frontier.refresh()
+        for x, y in frontier.goal_changes:
+            cell = y * self.N + x
+            self.goal[cell] = (x, y) in frontier.safe
+            for d in range(4):
+                self.update_state(cell * 4 + d)
+        frontier.goal_changes.clear()
+        super().refresh()
+
+class ExplorationFrontier:
+    # Unvisited cells worth walking to, kept up to date from the knowledge
+    # base change log instead of scanning the grid: `safe` holds the
+    # unvisited cells known to be safe, and `goal_changes` the cells that
+    # joined or left it since the distance field last looked.
+    def __init__(self, planner):
+        self.planner = planner
+        self.kb = planner.kb
+        self.N = planner.N
+        self.safe: Set[Tuple[int, int]] = set()
+        self.goal_changes: Set[Tuple[int, int]] = set()
+        self.changed_cells: Set[Tuple[int, int]] = set()
+        self.all_changed = True
+        self.field: Optional[FrontierDistanceField] = None
+        self.kb.add_listener(self.on_fact_changed)
+
+    def on_fact_changed(self, name: str, x: int, y: int, added: bool) -> None:
+        self.changed_cells.add((x, y))
+
+    def classify(self, x: int, y: int) -> None:
+        cell = (x, y)
+        safe = (cell not in self.kb.visited and
+                self.kb.fact_exists("Safe", x, y) and
+                not self.kb.fact_exists("PossiblePit", x, y) and
+                not self.kb.fact_exists("PossibleWumpus", x, y))
+        if safe != (cell in self.safe):
+            if self.field is not None:
+                self.goal_changes.add(cell)
+            if safe:
+                self.safe.add(cell)
+            else:
+                self.safe.discard(cell)
+
+    def refresh(self) -> None:
+        if self.all_changed:
+            cells = [(x, y) for y in range(self.N) for x in range(self.N)]
+        else:
+            cells = set(self.planner.affected_cells(self.changed_cells))
+        self.all_changed = False
+        self.changed_cells.clear()
+        for x, y in cells:
+            self.classify(x, y)
+
+    def route_to_nearest_safe(self, agent_x: int, agent_y: int,
+                              agent_dir: str) -> Optional[List[Tuple[int, int, str]]]:
+        # The field is built on first use and then repaired incrementally.
+        if self.field is None:
+            self.field = FrontierDistanceField(self)
+        if self.field.distance(agent_x, agent_y, agent_dir) == float('inf'):
+            return None
+        return self.planner.follow_field(self.field, agent_x, agent_y, agent_dir)
@@ -0,0 +1,96 @@
+from bisect import bisect_left, bisect_right, insort
+from const import DX, DY
+from topology import OPPOSITE
+
+class FireLines:
+    # Sorted per-row and per-column positions of the cells an arrow cares
+    # about, so the first such cell along a ray is a bisect instead of a
+    # walk:
+    #   "wumpus"  - Wumpus facts
+    #   "suspect" - Wumpus or PossibleWumpus facts
+    #   "blocker" - visited cells known to be Safe, where the agent stops
+    #               looking for a wumpus further along the ray
+    KINDS = ("wumpus", "suspect", "blocker")
+    WATCHED = ("Wumpus", "PossibleWumpus", "Safe", "Visited")
+
+    def __init__(self, kb):
+        self.kb = kb
+        self.N = kb.N
+        self.members = {kind: set() for kind in self.KINDS}
+        # rows[kind][y] holds sorted x; cols[kind][x] holds sorted y.
+        self.rows = {kind: [[] for _ in range(self.N)] for kind in self.KINDS}
+        self.cols = {kind: [[] for _ in range(self.N)] for kind in self.KINDS}
+        kb.add_listener(self.on_fact_changed)
+
+    def on_fact_changed(self, name, x, y, added):
+        if name in self.WATCHED and 0 <= x < self.N and 0 <= y < self.N:
+            self.update(x, y)
+
+    def update(self, x, y):
+        kb = self.kb
+        wumpus = kb.fact_exists("Wumpus", x, y)
+        wanted = {
+            "wumpus": wumpus,
+            "suspect": wumpus or kb.fact_exists("PossibleWumpus", x, y),
+            "blocker": (x, y) in kb.visited and kb.fact_exists("Safe", x, y),
+        }
+        for kind, present in wanted.items():
+            members = self.members[kind]
+            if present and (x, y) not in members:
+                members.add((x, y))
+                insort(self.rows[kind][y], x)
+                insort(self.cols[kind][x], y)
+            elif not present and (x, y) in members:
+                members.discard((x, y))
+                self.rows[kind][y].remove(x)
+                self.cols[kind][x].remove(y)
+
+    def first(self, kind, x, y, direction):
+        # Nearest cell of the kind strictly beyond (x, y) along the ray, or
+        # None.
+        if DX[direction]:
+            line, pos = self.rows[kind][y], x
+        else:
+            line, pos = self.cols[kind][x], y
+        if DX[direction] + DY[direction] > 0:
+            i = bisect_right(line, pos)
+            if i == len(line):
+                return None
+            found = line[i]
+        else:
+            i = bisect_left(line, pos)
+            if i == 0:
+                return None
+            found = line[i - 1]
+        return (found, y) if DX[direction] else (x, found)
+
+    def wumpus_in_line(self, x, y, direction):
+        # A confirmed wumpus before the first visited safe cell of the ray.
+        wumpus = self.first("wumpus", x, y, direction)
+        if wumpus is None:
+            return False
+        blocker = self.first("blocker", x, y, direction)
+        if blocker is None:
+            return True
+        return abs(wumpus[0] - x) + abs(wumpus[1] - y) <= abs(blocker[0] - x) + abs(blocker[1] - y)
+
+    def shooting_positions(self):
+        # Every (x, y, dir) the agent can stand on (a visited or Safe cell)
+        # with a confirmed wumpus in the line of fire.
+        kb = self.kb
+        positions = []
+        for wx, wy in sorted(self.members["wumpus"]):
+            for direction in ("N", "E", "S", "W"):
+                # Walk back from the wumpus against the shot direction, up to
+                # and including the first blocker.
+                dx, dy = DX[direction], DY[direction]
+                blocker = self.first("blocker", wx, wy, OPPOSITE[direction])
+                x, y = wx - dx, wy - dy
+                while 0 <= x < self.N and 0 <= y < self.N:
+                    if (x, y) in kb.visited or kb.fact_exists("Safe", x, y):
+                        positions.append((x, y, direction))
+                    if (x, y) == blocker:
+                        break
+                    x -= dx
+                    y -= dy
+        return positions
@@ -0,0 +1,266 @@
+import heapq
+from const import DIRECTIONS
+from topology import DIRECTION_INDEX, OPPOSITE
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from planning_module import PlanningModule
+
+class HierarchicalPathfinder:
+    # HPA* over the known-safe cells (Safe facts and visited cells). The grid
+    # is cut into cluster_size x cluster_size clusters; each run of open
+    # cells along a cluster border gets one portal at its middle. Abstract
+    # nodes are the (x, y, dir) states of stepping through a portal into a
+    # cluster, and every node keeps a search of its own cluster, which gives
+    # both its edges to the portals leading out and the refined paths.
+    # States are encoded like the planner's searches: (y*N + x)*4 + dir.
+    def __init__(self, planner, cluster_size: int = 8):
+        self.planner = planner
+        self.kb = planner.kb
+        self.N = planner.N
+        self.cluster_size = cluster_size
+        self.side = (self.N + cluster_size - 1) // cluster_size
+        self.open = bytearray(self.N * self.N)
+        # Portals across the east and north border of each cluster, as
+        # (inside cell, outside cell) index pairs.
+        self.portals: Dict[Tuple[int, int, str], List[Tuple[int, int]]] = {}
+        self.searches: Dict[int, Tuple[Dict[int, float], Dict[int, int]]] = {}
+        self.edges: Dict[int, List[Tuple[int, float, int]]] = {}
+        self.cluster_nodes: Dict[Tuple[int, int], List[int]] = {}
+        self.changed_cells: Set[Tuple[int, int]] = set()
+        self.all_changed = True
+        self.kb.add_listener(self.on_fact_changed)
+
+    def on_fact_changed(self, name: str, x: int, y: int, added: bool) -> None:
+        self.changed_cells.add((x, y))
+
+    def cluster_of(self, x: int, y: int) -> Tuple[int, int]:
+        return x // self.cluster_size, y // self.cluster_size
+
+    def bounds(self, cluster: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        x0, y0 = cluster[0] * self.cluster_size, cluster[1] * self.cluster_size
+        return x0, y0, min(x0 + self.cluster_size, self.N), min(y0 + self.cluster_size, self.N)
+
+    def is_open(self, x: int, y: int) -> bool:
+        return (x, y) in self.kb.visited or self.kb.fact_exists("Safe", x, y)
+
+    def find_portals(self, cluster: Tuple[int, int], d: str) -> List[Tuple[int, int]]:
+        x0, y0, x1, y1 = self.bounds(cluster)
+        if d == 'E':
+            if x1 >= self.N:
+                return []
+            pairs = [(y * self.N + x1 - 1, y * self.N + x1) for y in range(y0, y1)]
+        else:
+            if y1 >= self.N:
+                return []
+            pairs = [(y1 - 1) * self.N + x for x in range(x0, x1)]
+            pairs = [(i, i + self.N) for i in pairs]
+        portals = []
+        run: List[Tuple[int, int]] = []
+        for pair in pairs + [None]:
+            if pair is not None and self.open[pair[0]] and self.open[pair[1]]:
+                run.append(pair)
+            elif run:
+                portals.append(run[len(run) // 2])
+                run = []
+        return portals
+
+    def exits(self, cluster: Tuple[int, int]) -> List[Tuple[int, int, str]]:
+        # (inside cell, outside cell, direction of the step) for every portal
+        # of the cluster.
+        cx, cy = cluster
+        result = []
+        for inside, outside in self.portals.get((cx, cy, 'E'), []):
+            result.append((inside, outside, 'E'))
+        for inside, outside in self.portals.get((cx, cy, 'N'), []):
+            result.append((inside, outside, 'N'))
+        for outside, inside in self.portals.get((cx - 1, cy, 'E'), []):
+            result.append((inside, outside, 'W'))
+        for outside, inside in self.portals.get((cx, cy - 1, 'N'), []):
+            result.append((inside, outside, 'S'))
+        return result
+
+    def local_search(self, start: int, cluster: Tuple[int, int]) -> Tuple[Dict[int, float], Dict[int, int]]:
+        # Uniform-cost search over the open states of one cluster.
+        x0, y0, x1, y1 = self.bounds(cluster)
+        dist = {start: 0.0}
+        parent = {start: -1}
+        queue = [(0.0, start)]
+        while queue:
+            cost, state = heapq.heappop(queue)
+            if cost > dist[state]:
+                continue
+            cell, d = divmod(state, 4)
+            y, x = divmod(cell, self.N)
+            for next_dir, nx, ny in self.planner.topology.moves(x, y):
+                if not (x0 <= nx < x1 and y0 <= ny < y1) or not self.open[ny * self.N + nx]:
+                    continue
+                new_cost = cost + self.step_cost(DIRECTIONS[d], next_dir, nx, ny)
+                next_state = (ny * self.N + nx) * 4 + DIRECTION_INDEX[next_dir]
+                if new_cost < dist.get(next_state, float('inf')):
+                    dist[next_state] = new_cost
+                    parent[next_state] = state
+                    heapq.heappush(queue, (new_cost, next_state))
+        return dist, parent
+
+    def step_cost(self, current_dir: str, next_dir: str, nx: int, ny: int) -> float:
+        return self.planner.turn_cost(current_dir, next_dir) + self.planner.entry_cost(nx, ny)
+
+    def exit_edges(self, dist: Dict[int, float], cluster: Tuple[int, int]) -> List[Tuple[int, float, int]]:
+        # (node entered, cost, state stepped from) for the cheapest way
+        # through each portal.
+        edges = []
+        for inside, outside, step_dir in self.exits(cluster):
+            best, via = float('inf'), -1
+            for d, direction in enumerate(DIRECTIONS):
+                cost = dist.get(inside * 4 + d)
+                if cost is None:
+                    continue
+                cost += self.planner.turn_cost(direction, step_dir)
+                if cost < best:
+                    best, via = cost, inside * 4 + d
+            if via == -1:
+                continue
+            y, x = divmod(outside, self.N)
+            best += self.planner.entry_cost(x, y)
+            edges.append((outside * 4 + DIRECTION_INDEX[step_dir], best, via))
+        return edges
+
+    def rebuild_cluster(self, cluster: Tuple[int, int]) -> None:
+        for node in self.cluster_nodes.get(cluster, []):
+            self.searches.pop(node, None)
+            self.edges.pop(node, None)
+        nodes = sorted({outside_state for _, _, outside_state in self.entries(cluster)})
+        self.cluster_nodes[cluster] = nodes
+        for node in nodes:
+            dist, parent = self.local_search(node, cluster)
+            self.searches[node] = (dist, parent)
+            self.edges[node] = self.exit_edges(dist, cluster)
+
+    def entries(self, cluster: Tuple[int, int]) -> Iterable[Tuple[int, int, int]]:
+        # Portals stepped through into the cluster, with the state entered.
+        for inside, outside, step_dir in self.exits(cluster):
+            yield outside, inside, inside * 4 + DIRECTION_INDEX[OPPOSITE[step_dir]]
+
+    def refresh(self) -> None:
+        if self.all_changed:
+            cells = [(x, y) for y in range(self.N) for x in range(self.N)]
+        else:
+            cells = list(self.planner.affected_cells(self.changed_cells))
+        self.all_changed = False
+        self.changed_cells.clear()
+        if not cells:
+            return
+
+        dirty = set()
+        for x, y in cells:
+            self.open[y * self.N + x] = 1 if self.is_open(x, y) else 0
+            dirty.add(self.cluster_of(x, y))
+            # Exit edges price the first cell across the border, so a cell
+            # on a border also dirties the clusters next to it.
+            for nx, ny in self.planner.topology.neighbors(x, y):
+                dirty.add(self.cluster_of(nx, ny))
+        # A changed cell can move the portals on its cluster's borders, which
+        # the neighbours see as well.
+        for cx, cy in list(dirty):
+            for d, (ox, oy) in (('E', (cx + 1, cy)), ('N', (cx, cy + 1))):
+                portals = self.find_portals((cx, cy), d)
+                if portals != self.portals.get((cx, cy, d), []):
+                    self.portals[(cx, cy, d)] = portals
+                    dirty.add((ox, oy))
+            for d, (ox, oy) in (('E', (cx - 1, cy)), ('N', (cx, cy - 1))):
+                if ox < 0 or oy < 0:
+                    continue
+                portals = self.find_portals((ox, oy), d)
+                if portals != self.portals.get((ox, oy, d), []):
+                    self.portals[(ox, oy, d)] = portals
+                    dirty.add((ox, oy))
+        for cluster in dirty:
+            if cluster[0] < self.side and cluster[1] < self.side:
+                self.rebuild_cluster(cluster)
+
+    def refine(self, parent: Dict[int, int], state: int) -> List[int]:
+        path = []
+        while state != -1:
+            path.append(state)
+            state = parent[state]
+        path.reverse()
+        return path
+
+    def find_route(self, start_x: int, start_y: int, start_dir: str,
+                   targets: Iterable[Tuple[int, int]]) -> Optional[List[Tuple[int, int, str]]]:
+        # Cheapest abstract route from the agent to any target cell. The
+        # search stops once no open node can beat the best target found.
+        self.refresh()
+        by_cluster: Dict[Tuple[int, int], List[int]] = {}
+        for x, y in targets:
+            if self.open[y * self.N + x]:
+                by_cluster.setdefault(self.cluster_of(x, y), []).append(y * self.N + x)
+        if not by_cluster:
+            return None
+
+        start = self.planner.encode_state(start_x, start_y, start_dir)
+        start_cluster = self.cluster_of(start_x, start_y)
+        start_search = self.local_search(start, start_cluster)
+        best, best_end = float('inf'), None
+
+        def reach_targets(node, g, cluster, dist):
+            nonlocal best, best_end
+            for cell in by_cluster.get(cluster, ()):
+                for d in range(4):
+                    cost = dist.get(cell * 4 + d)
+                    if cost is not None and g + cost < best:
+                        best, best_end = g + cost, (node, cell * 4 + d)
+
+        reach_targets(-1, 0.0, start_cluster, start_search[0])
+        g_scores = {}
+        came_from: Dict[int, Tuple[int, int]] = {}
+        queue = []
+        for node, cost, via in self.exit_edges(start_search[0], start_cluster):
+            if cost < g_scores.get(node, float('inf')):
+                g_scores[node] = cost
+                came_from[node] = (-1, via)
+                heapq.heappush(queue, (cost, self.tie_key(node), node))
+
+        while queue:
+            g, _, node = heapq.heappop(queue)
+            if g >= best:
+                break
+            if g > g_scores[node]:
+                continue
+            y, x = divmod(node // 4, self.N)
+            reach_targets(node, g, self.cluster_of(x, y), self.searches[node][0])
+            for next_node, cost, via in self.edges[node]:
+                if g + cost < g_scores.get(next_node, float('inf')):
+                    g_scores[next_node] = g + cost
+                    came_from[next_node] = (node, via)
+                    heapq.heappush(queue, (g + cost, self.tie_key(next_node), next_node))
+
+        if best_end is None:
+            return None
+        # Refine the chosen clusters only, walking back from the target.
+        node, state = best_end
+        states: List[int] = []
+        while True:
+            parent = start_search[1] if node == -1 else self.searches[node][1]
+            states = self.refine(parent, state) + states
+            if node == -1:
+                break
+            node, state = came_from[node]
+        return [self.planner.decode_state(s) for s in states]
+
+    def tie_key(self, node: int) -> int:
+        x, y, direction = self.planner.decode_state(node)
+        return self.planner.tie_break(x, y, direction)
+
+class HierarchicalPlanner(PlanningModule):
+    # PlanningModule that walks to far frontier cells with HPA* over the
+    # known-safe cells instead of a flat search, for large maps.
+    def __init__(self, knowledge_base, N, probability_engine=None, cluster_size: int = 8):
+        super().__init__(knowledge_base, N, probability_engine)
+        self.pathfinder = HierarchicalPathfinder(self, cluster_size)
+
+    def route_to_frontier(self, agent_x: int, agent_y: int, agent_dir: str) -> Optional[List[Tuple[int, int, str]]]:
+        self.frontier.refresh()
+        targets = [cell for cell in self.frontier.safe if self.kb.same_safe_region((agent_x, agent_y), cell)]
+        if not targets:
+            return None
+        return self.pathfinder.find_route(agent_x, agent_y, agent_dir, targets)
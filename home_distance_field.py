@@ -0,0 +1,139 @@
+import heapq
+from const import DIRECTIONS, DX, DY
+from topology import DIRECTION_INDEX, TURNS
+from typing import List, Optional, Set, Tuple
+
+class HomeDistanceField:
+    # Cost-to-(0,0) for every (x, y, dir) state under the planner's movement
+    # costs, kept up to date with Lifelong Planning A* run backwards from
+    # home (no heuristic, since every state's value is wanted). When the
+    # risk of a cell changes, only the states that move into it are
+    # re-evaluated and the change is propagated as far as it matters.
+    # States are encoded like the planner's searches: (y*N + x)*4 + dir.
+    def __init__(self, planner, avoid_dangerous: bool):
+        self.planner = planner
+        self.N = planner.N
+        self.avoid_dangerous = avoid_dangerous
+        size = self.N * self.N * 4
+        self.g: List[float] = [float('inf')] * size
+        self.rhs: List[float] = [float('inf')] * size
+        self.entry: List[Optional[float]] = [None] * (self.N * self.N)
+        self.queue: List[Tuple[float, int]] = []
+        self.changed_cells: Set[Tuple[int, int]] = set()
+        self.all_changed = True
+        planner.kb.add_listener(self.on_fact_changed)
+        self.seed_goals()
+
+    def seed_goals(self) -> None:
+        for d in range(4):
+            self.rhs[d] = 0.0
+            heapq.heappush(self.queue, (0.0, d))
+
+    def is_goal(self, state: int) -> bool:
+        return state < 4
+
+    def on_fact_changed(self, name: str, x: int, y: int, added: bool) -> None:
+        self.changed_cells.add((x, y))
+
+    def entry_cost(self, x: int, y: int) -> float:
+        risk = self.planner.calculate_cell_risk(x, y)
+        if risk == float('inf') or (self.avoid_dangerous and risk > 80):
+            return float('inf')
+        return self.planner.entry_cost(x, y)
+
+    def successors(self, state: int):
+        cell, d = divmod(state, 4)
+        y, x = divmod(cell, self.N)
+        turns = TURNS[DIRECTIONS[d]]
+        for next_dir, nx, ny in self.planner.topology.moves(x, y):
+            cost = self.entry[ny * self.N + nx]
+            if cost == float('inf'):
+                continue
+            yield (ny * self.N + nx) * 4 + DIRECTION_INDEX[next_dir], cost + turns[next_dir]
+
+    def predecessors(self, state: int):
+        # States that reach `state` in one move: any heading in the cell
+        # behind it.
+        cell, d = divmod(state, 4)
+        y, x = divmod(cell, self.N)
+        px, py = x - DX[DIRECTIONS[d]], y - DY[DIRECTIONS[d]]
+        if 0 <= px < self.N and 0 <= py < self.N:
+            base = (py * self.N + px) * 4
+            return range(base, base + 4)
+        return range(0)
+
+    def update_state(self, state: int) -> None:
+        if self.is_goal(state):
+            self.rhs[state] = 0.0
+        else:
+            # successors() inlined: this runs for every state the repair
+            # touches.
+            cell, d = divmod(state, 4)
+            y, x = divmod(cell, self.N)
+            turns = TURNS[DIRECTIONS[d]]
+            entry, g, N = self.entry, self.g, self.N
+            best = float('inf')
+            for next_dir, nx, ny in self.planner.topology.moves(x, y):
+                next_cell = ny * N + nx
+                value = entry[next_cell] + turns[next_dir] + g[next_cell * 4 + DIRECTION_INDEX[next_dir]]
+                if value < best:
+                    best = value
+            self.rhs[state] = best
+        if self.g[state] != self.rhs[state]:
+            heapq.heappush(self.queue, (min(self.g[state], self.rhs[state]), state))
+
+
+    def compute(self) -> None:
+        while self.queue:
+            key, state = heapq.heappop(self.queue)
+            g, rhs = self.g[state], self.rhs[state]
+            if g == rhs or key != min(g, rhs):
+                continue
+            if g > rhs:
+                self.g[state] = rhs
+            else:
+                self.g[state] = float('inf')
+                self.update_state(state)
+            for pred in self.predecessors(state):
+                self.update_state(pred)
+
+    def refresh(self) -> None:
+        if self.all_changed or (self.changed_cells and self.planner.probability_engine is not None):
+            cells = [(x, y) for y in range(self.N) for x in range(self.N)]
+        else:
+            cells = list(self.planner.affected_cells(self.changed_cells))
+        self.all_changed = False
+        self.changed_cells.clear()
+
+        # Store every new entry cost before re-evaluating the states that
+        # move into those cells.
+        repriced = []
+        for x, y in cells:
+            cost = self.entry_cost(x, y)
+            i = y * self.N + x
+            if cost != self.entry[i]:
+                self.entry[i] = cost
+                repriced.append(i)
+        for i in repriced:
+            for d in range(4):
+                for state in self.predecessors(i * 4 + d):
+                    self.update_state(state)
+        self.compute()
+
+    def distance(self, x: int, y: int, direction: str) -> float:
+        self.refresh()
+        return self.g[(y * self.N + x) * 4 + DIRECTION_INDEX[direction]]
+
+    def next_direction(self, x: int, y: int, direction: str) -> Optional[str]:
+        # Direction of the first move of a cheapest way home, or None when
+        # home is unreachable or already reached.
+        self.refresh()
+        state = (y * self.N + x) * 4 + DIRECTION_INDEX[direction]
+        if self.is_goal(state) or self.g[state] == float('inf'):
+            return None
+        best, best_dir = float('inf'), None
+        for next_state, cost in self.successors(state):
+            value = cost + self.g[next_state]
+            if value < best:
+                best, best_dir = value, DIRECTIONS[next_state % 4]
+        return best_dir
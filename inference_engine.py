@@ -1,4 +1,86 @@
-from const import DX, DY
+from const import DIRECTIONS, DX, DY
+from truth_maintenance import TruthMaintenance
+
+# Every derived fact depends only on stored facts at most this many steps
+# away (Pit -> Breeze neighbour -> its neighbours' SafePit -> their percepts).
+QUERY_RADIUS = 3
+
+class QueryView:
+    # Read-only stand-in for the KnowledgeBase whose fact_exists proves
+    # derived predicates on demand instead of reading materialised facts.
+    change_radius = QUERY_RADIUS
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.kb = engine.kb
+        # (start cell, kb version) and the provably safe region around it.
+        self.region = None
+
+    def fact_exists(self, name, x, y):
+        return self.engine.query(name, x, y)
+
+    def wumpus_in_line(self, x, y, direction):
+        # Walks the ray, since Wumpus facts may only be provable.
+        for cx, cy in self.kb.topology.ray(x, y, direction):
+            if self.fact_exists("Wumpus", cx, cy):
+                return True
+            if self.fact_exists("Safe", cx, cy) and (cx, cy) in self.kb.visited:
+                break
+        return False
+
+    def shooting_positions(self):
+        # Same positions as FireLines.shooting_positions, but a wumpus may
+        # only be provable from a stench next to it, so the candidates are
+        # the stored Wumpus facts and the stenches' neighbours.
+        wumpuses = set(self.kb.iter_facts_of("Wumpus"))
+        for sx, sy in self.kb.iter_facts_of("Stench"):
+            wumpuses.update(self.kb.get_adjacent(sx, sy))
+        positions = []
+        for wx, wy in sorted(wumpuses):
+            if not self.fact_exists("Wumpus", wx, wy):
+                continue
+            for direction in DIRECTIONS:
+                # Walk back against the shot up to the first visited safe cell.
+                dx, dy = DX[direction], DY[direction]
+                x, y = wx - dx, wy - dy
+                while 0 <= x < self.kb.N and 0 <= y < self.kb.N:
+                    safe = self.fact_exists("Safe", x, y)
+                    visited = (x, y) in self.kb.visited
+                    if visited or safe:
+                        positions.append((x, y, direction))
+                    if visited and safe:
+                        break
+                    x -= dx
+                    y -= dy
+        return positions
+
+    def same_safe_region(self, a, b):
+        # Proving more cells safe only joins regions, so a path through the
+        # materialised ones settles it. Otherwise flood the provably safe
+        # cells from a, once per knowledge base version.
+        if self.kb.same_safe_region(a, b):
+            return True
+        return b in self.safe_region(a)
+
+    def safe_region(self, cell):
+        key = (cell, self.kb.version)
+        if self.region is not None and self.region[0] == key:
+            return self.region[1]
+        region = set()
+        if cell in self.kb.visited or self.fact_exists("Safe", *cell):
+            region.add(cell)
+            stack = [cell]
+            while stack:
+                x, y = stack.pop()
+                for n in self.kb.get_adjacent(x, y):
+                    if n not in region and (n in self.kb.visited or self.fact_exists("Safe", *n)):
+                        region.add(n)
+                        stack.append(n)
+        self.region = (key, region)
+        return region
+
+    def __getattr__(self, attr):
+        return getattr(self.kb, attr)
 
 class InferenceEngine:
     def __init__(self, knowledge_base):
@@ -10,10 +92,57 @@ class InferenceEngine:
             self.rule_confirm_pit_from_breeze,
             self.rule_confirm_wumpus_from_stench,
         ]
+        self.provers = {
+            "Safe": self.prove_safe,
+            "SafePit": self.prove_safe_pit,
+            "SafeWumpus": self.prove_safe_wumpus,
+            "Pit": self.prove_pit,
+            "Wumpus": self.prove_wumpus,
+            "PossiblePit": self.prove_possible_pit,
+            "PossibleWumpus": self.prove_possible_wumpus,
+        }
+        # Tabled query results per cell, created on the first query.
+        self.table = None
+        self.tms = TruthMaintenance(knowledge_base)
+
+    def assert_fact(self, name, x, y):
+        added = self.kb.add_fact(name, x, y)
+        self.tms.assume((name, x, y))
+        return added
+
+    def conclude(self, name, x, y, *antecedents):
+        if self.kb.add_fact(name, x, y):
+            self.tms.justify((name, x, y), antecedents)
+            return True
+        return False
+
+    def retract(self, name, x, y):
+        return self.tms.retract(name, x, y)
+
+    def explain(self, name, x, y):
+        # Antecedents of one derivation of a fact the rules could conclude
+        # from the current knowledge base, for code that adds facts in bulk.
+        if name == "Safe":
+            return (("SafePit", x, y), ("SafeWumpus", x, y))
+        if name in ("SafePit", "SafeWumpus"):
+            percept = "NoBreeze" if name == "SafePit" else "NoStench"
+            for nx, ny in self.kb.get_adjacent(x, y):
+                if self.kb.fact_exists(percept, nx, ny):
+                    return ((percept, nx, ny),)
+        if name in ("Pit", "Wumpus"):
+            percept, safe = ("Breeze", "SafePit") if name == "Pit" else ("Stench", "SafeWumpus")
+            for bx, by in self.kb.get_adjacent(x, y):
+                if not self.kb.fact_exists(percept, bx, by):
+                    continue
+                others = [(safe, nx, ny) for nx, ny in self.kb.get_adjacent(bx, by) if (nx, ny) != (x, y)]
+                if all(self.kb.fact_exists(*fact) for fact in others):
+                    return ((percept, bx, by), *others)
+        return ()
+
     def rule_no_breeze(self, x, y):
         changed = False
         for nx, ny in self.kb.get_adjacent(x, y):
-            if self.kb.add_fact("SafePit", nx, ny):
+            if self.conclude("SafePit", nx, ny, ("NoBreeze", x, y)):
                 changed = True
         return changed
 
@@ -21,14 +150,14 @@ class InferenceEngine:
         changed = False
         for nx, ny in self.kb.get_adjacent(x, y):
             if not self.kb.fact_exists("Safe", nx, ny):
-                if self.kb.add_fact("PossiblePit", nx, ny):
+                if self.conclude("PossiblePit", nx, ny, ("Breeze", x, y)):
                     changed = True
         return changed
 
     def rule_no_stench(self, x, y):
         changed = False
         for nx, ny in self.kb.get_adjacent(x, y):
-            if self.kb.add_fact("SafeWumpus", nx, ny):
+            if self.conclude("SafeWumpus", nx, ny, ("NoStench", x, y)):
                 changed = True
         return changed
 
@@ -36,7 +165,7 @@ class InferenceEngine:
         changed = False
         for nx, ny in self.kb.get_adjacent(x, y):
             if not self.kb.fact_exists("Safe", nx, ny):
-                if self.kb.add_fact("PossibleWumpus", nx, ny):
+                if self.conclude("PossibleWumpus", nx, ny, ("Stench", x, y)):
                     changed = True
         return changed
 
@@ -44,116 +173,235 @@ class InferenceEngine:
         changed = False
         for x in range(self.kb.N):
             for y in range(self.kb.N):
-                if self.kb.fact_exists("SafePit", x, y) and self.kb.fact_exists("SafeWumpus", x, y):
-                    if self.kb.add_fact("Safe", x, y):
-                        changed = True
-                    if self.kb.remove_fact("PossiblePit", x, y):
-                        changed = True
-                    if self.kb.remove_fact("PossibleWumpus", x, y):
-                        changed = True
+                if self.safecombination_at(x, y):
+                    changed = True
+        return changed
+
+    def safecombination_at(self, x, y):
+        changed = False
+        if self.kb.fact_exists("SafePit", x, y) and self.kb.fact_exists("SafeWumpus", x, y):
+            if self.conclude("Safe", x, y, ("SafePit", x, y), ("SafeWumpus", x, y)):
+                changed = True
+            if self.kb.remove_fact("PossiblePit", x, y):
+                changed = True
+            if self.kb.remove_fact("PossibleWumpus", x, y):
+                changed = True
         return changed
 
     def rule_eliminate_possible_pit_by_breeze_conflict(self):
         changed = False
         possible_pits = list(self.kb.iter_facts_of("PossiblePit"))
         for (px, py) in possible_pits:
-            neighbors = self.kb.get_adjacent(px, py)
-            visited_neighbors = [n for n in neighbors if (self.kb.fact_exists("Breeze", *n) or self.kb.fact_exists("NoBreeze", *n))]
-            if not visited_neighbors:
-                continue
-            has_b = any(self.kb.fact_exists("Breeze", *n) for n in visited_neighbors)
-            has_nb = any(self.kb.fact_exists("NoBreeze", *n) for n in visited_neighbors)
-            if has_b and has_nb:
-                if self.kb.add_fact("SafePit", px, py):
-                    changed = True
-                if self.kb.remove_fact("PossiblePit", px, py):
-                    changed = True
+            if self.eliminate_possible_pit_at(px, py):
+                changed = True
+        return changed
+
+    def eliminate_possible_pit_at(self, px, py):
+        if not self.kb.fact_exists("PossiblePit", px, py):
+            return False
+        changed = False
+        neighbors = self.kb.get_adjacent(px, py)
+        visited_neighbors = [n for n in neighbors if (self.kb.fact_exists("Breeze", *n) or self.kb.fact_exists("NoBreeze", *n))]
+        if not visited_neighbors:
+            return False
+        has_b = any(self.kb.fact_exists("Breeze", *n) for n in visited_neighbors)
+        has_nb = any(self.kb.fact_exists("NoBreeze", *n) for n in visited_neighbors)
+        if has_b and has_nb:
+            no_breeze = next(n for n in visited_neighbors if self.kb.fact_exists("NoBreeze", *n))
+            if self.conclude("SafePit", px, py, ("NoBreeze", *no_breeze)):
+                changed = True
+            if self.kb.remove_fact("PossiblePit", px, py):
+                changed = True
         return changed
 
     def rule_eliminate_possible_wumpus_by_stench_conflict(self):
         changed = False
         possible_w = list(self.kb.iter_facts_of("PossibleWumpus"))
         for (px, py) in possible_w:
-            neighbors = self.kb.get_adjacent(px, py)
-            visited_neighbors = [n for n in neighbors if (self.kb.fact_exists("Stench", *n) or self.kb.fact_exists("NoStench", *n))]
-            if not visited_neighbors:
-                continue
-            has_s = any(self.kb.fact_exists("Stench", *n) for n in visited_neighbors)
-            has_ns = any(self.kb.fact_exists("NoStench", *n) for n in visited_neighbors)
-            if has_s and has_ns:
-                if self.kb.add_fact("SafeWumpus", px, py):
-                    changed = True
-                if self.kb.remove_fact("PossibleWumpus", px, py):
-                    changed = True
+            if self.eliminate_possible_wumpus_at(px, py):
+                changed = True
+        return changed
+
+    def eliminate_possible_wumpus_at(self, px, py):
+        if not self.kb.fact_exists("PossibleWumpus", px, py):
+            return False
+        changed = False
+        neighbors = self.kb.get_adjacent(px, py)
+        visited_neighbors = [n for n in neighbors if (self.kb.fact_exists("Stench", *n) or self.kb.fact_exists("NoStench", *n))]
+        if not visited_neighbors:
+            return False
+        has_s = any(self.kb.fact_exists("Stench", *n) for n in visited_neighbors)
+        has_ns = any(self.kb.fact_exists("NoStench", *n) for n in visited_neighbors)
+        if has_s and has_ns:
+            no_stench = next(n for n in visited_neighbors if self.kb.fact_exists("NoStench", *n))
+            if self.conclude("SafeWumpus", px, py, ("NoStench", *no_stench)):
+                changed = True
+            if self.kb.remove_fact("PossibleWumpus", px, py):
+                changed = True
         return changed
 
     def rule_confirm_pit_from_breeze(self):
         changed = False
         for (bx, by) in self.kb.iter_facts_of("Breeze"):
-            neighbors = self.kb.get_adjacent(bx, by)
+            if self.confirm_pit_at(bx, by):
+                changed = True
+        return changed
 
-            unknown_neighbors = []
-            for nx, ny in neighbors:
-                if not self.kb.fact_exists("SafePit", nx, ny):
-                    unknown_neighbors.append((nx, ny))
+    def confirm_pit_at(self, bx, by):
+        if not self.kb.fact_exists("Breeze", bx, by):
+            return False
+        changed = False
+        neighbors = self.kb.get_adjacent(bx, by)
 
-            if len(unknown_neighbors) == 1:
-                px, py = unknown_neighbors[0]
-                if self.kb.add_fact("Pit", px, py):
-                    changed = True
-                if self.kb.remove_fact("SafePit", px, py):
-                    changed = True
-                if self.kb.remove_fact("PossiblePit", px, py):
-                    changed = True
+        unknown_neighbors = []
+        for nx, ny in neighbors:
+            if not self.kb.fact_exists("SafePit", nx, ny):
+                unknown_neighbors.append((nx, ny))
+
+        if len(unknown_neighbors) == 1:
+            px, py = unknown_neighbors[0]
+            support = [("SafePit", nx, ny) for nx, ny in neighbors if (nx, ny) != (px, py)]
+            if self.conclude("Pit", px, py, ("Breeze", bx, by), *support):
+                changed = True
+            if self.kb.remove_fact("SafePit", px, py):
+                changed = True
+            if self.kb.remove_fact("PossiblePit", px, py):
+                changed = True
         return changed
 
     def rule_confirm_wumpus_from_stench(self):
         changed = False
         for (sx, sy) in self.kb.iter_facts_of("Stench"):
-            neighbors = self.kb.get_adjacent(sx, sy)
+            if self.confirm_wumpus_at(sx, sy):
+                changed = True
+        return changed
 
-            unknown_neighbors = []
-            for nx, ny in neighbors:
-                if not self.kb.fact_exists("SafeWumpus", nx, ny):
-                    unknown_neighbors.append((nx, ny))
+    def confirm_wumpus_at(self, sx, sy):
+        if not self.kb.fact_exists("Stench", sx, sy):
+            return False
+        changed = False
+        neighbors = self.kb.get_adjacent(sx, sy)
 
-            if len(unknown_neighbors) == 1:
-                wx, wy = unknown_neighbors[0]
-                if self.kb.add_fact("Wumpus", wx, wy):
-                    changed = True
-                if self.kb.remove_fact("SafeWumpus", wx, wy):
-                    changed = True
-                if self.kb.remove_fact("PossibleWumpus", wx, wy):
-                    changed = True
+        unknown_neighbors = []
+        for nx, ny in neighbors:
+            if not self.kb.fact_exists("SafeWumpus", nx, ny):
+                unknown_neighbors.append((nx, ny))
+
+        if len(unknown_neighbors) == 1:
+            wx, wy = unknown_neighbors[0]
+            support = [("SafeWumpus", nx, ny) for nx, ny in neighbors if (nx, ny) != (wx, wy)]
+            if self.conclude("Wumpus", wx, wy, ("Stench", sx, sy), *support):
+                changed = True
+            if self.kb.remove_fact("SafeWumpus", wx, wy):
+                changed = True
+            if self.kb.remove_fact("PossibleWumpus", wx, wy):
+                changed = True
         return changed
 
     def handle_shoot(self, agent_x, agent_y, agent_dir):
-        dx, dy = DX[agent_dir], DY[agent_dir]
-        x, y = agent_x + dx, agent_y + dy
+        target = self.kb.fire_lines.first("suspect", agent_x, agent_y, agent_dir)
+        if target is None:
+            return
+        x, y = target
+        self.retract("Wumpus", x, y)
+        self.retract("PossibleWumpus", x, y)
+        self.assert_fact("SafeWumpus", x, y)
         
-        while 0 <= x < self.kb.N and 0 <= y < self.kb.N:
-            if self.kb.fact_exists("Wumpus", x, y) or self.kb.fact_exists("PossibleWumpus", x, y):
-                self.kb.remove_fact("Wumpus", x, y)
-                self.kb.remove_fact("PossibleWumpus", x, y)
-                self.kb.add_fact("SafeWumpus", x, y)
-                
-                for nx, ny in self.kb.get_adjacent(x, y):
-                    if not self.kb.fact_exists("Wumpus", nx, ny) and not self.kb.fact_exists("PossibleWumpus", nx, ny):
-                        self.kb.add_fact("SafeWumpus", nx, ny)
-                
-                break
-            x += dx
-            y += dy
+        for nx, ny in self.kb.get_adjacent(x, y):
+            if not self.kb.fact_exists("Wumpus", nx, ny) and not self.kb.fact_exists("PossibleWumpus", nx, ny):
+                self.assert_fact("SafeWumpus", nx, ny)
+
+    def wumpus_killed(self):
+        # Called once per scream; engines that count kills override it.
+        pass
 
     def handle_all_wumpuses_killed(self):
-        for y in range(self.kb.N):
-            for x in range(self.kb.N):
-                if (self.kb.fact_exists("PossibleWumpus", x, y) or 
-                    self.kb.fact_exists("Wumpus", x, y)):
-                    self.kb.remove_fact("PossibleWumpus", x, y)
-                    self.kb.remove_fact("Wumpus", x, y)
-                    self.kb.add_fact("SafeWumpus", x, y)
-                    self.kb.add_fact("Safe", x, y)
+        suspects = set(self.kb.iter_facts_of("PossibleWumpus")) | set(self.kb.iter_facts_of("Wumpus"))
+
+        # With no wumpus left every stench is stale; retracting them also
+        # withdraws the wumpus conclusions drawn from them.
+        for x, y in list(self.kb.iter_facts_of("Stench")):
+            self.retract("Stench", x, y)
+
+        for x, y in suspects:
+            self.retract("PossibleWumpus", x, y)
+            self.retract("Wumpus", x, y)
+            self.assert_fact("SafeWumpus", x, y)
+            self.assert_fact("Safe", x, y)
+
+    def query_view(self):
+        return QueryView(self)
+
+    def query(self, name, x, y):
+        prover = self.provers.get(name)
+        if prover is None or not (0 <= x < self.kb.N and 0 <= y < self.kb.N):
+            return self.kb.fact_exists(name, x, y)
+        if self.table is None:
+            self.table = {}
+            self.kb.add_listener(self.invalidate_table)
+        goals = self.table.get((x, y))
+        if goals is None:
+            goals = self.table[(x, y)] = {}
+        result = goals.get(name)
+        if result is None:
+            result = prover(x, y)
+            goals[name] = result
+        return result
+
+    def invalidate_table(self, name, x, y, added):
+        for dy in range(-QUERY_RADIUS, QUERY_RADIUS + 1):
+            span = QUERY_RADIUS - abs(dy)
+            for dx in range(-span, span + 1):
+                self.table.pop((x + dx, y + dy), None)
+
+    # Backward-chaining counterparts of the forward rules: each proves what
+    # the forward-chaining fixpoint would hold for one cell.
+    def has_percept_conflict(self, x, y, possible, percept, no_percept):
+        if not self.kb.fact_exists(possible, x, y):
+            return False
+        neighbors = self.kb.get_adjacent(x, y)
+        return (any(self.kb.fact_exists(percept, *n) for n in neighbors) and
+                any(self.kb.fact_exists(no_percept, *n) for n in neighbors))
+
+    def prove_safe_pit(self, x, y):
+        return (self.kb.fact_exists("SafePit", x, y) or
+                self.has_percept_conflict(x, y, "PossiblePit", "Breeze", "NoBreeze"))
+
+    def prove_safe_wumpus(self, x, y):
+        return (self.kb.fact_exists("SafeWumpus", x, y) or
+                self.has_percept_conflict(x, y, "PossibleWumpus", "Stench", "NoStench"))
+
+    def prove_safe(self, x, y):
+        return (self.kb.fact_exists("Safe", x, y) or
+                (self.query("SafePit", x, y) and self.query("SafeWumpus", x, y)))
+
+    def is_single_unknown(self, x, y, percept, safe):
+        if self.query(safe, x, y):
+            return False
+        for bx, by in self.kb.get_adjacent(x, y):
+            if not self.kb.fact_exists(percept, bx, by):
+                continue
+            if all(self.query(safe, nx, ny) for nx, ny in self.kb.get_adjacent(bx, by) if (nx, ny) != (x, y)):
+                return True
+        return False
+
+    def prove_pit(self, x, y):
+        return self.kb.fact_exists("Pit", x, y) or self.is_single_unknown(x, y, "Breeze", "SafePit")
+
+    def prove_wumpus(self, x, y):
+        return self.kb.fact_exists("Wumpus", x, y) or self.is_single_unknown(x, y, "Stench", "SafeWumpus")
+
+    def prove_possible_pit(self, x, y):
+        return (self.kb.fact_exists("PossiblePit", x, y) and
+                not (self.query("SafePit", x, y) and self.query("SafeWumpus", x, y)) and
+                not self.has_percept_conflict(x, y, "PossiblePit", "Breeze", "NoBreeze") and
+                not self.query("Pit", x, y))
+
+    def prove_possible_wumpus(self, x, y):
+        return (self.kb.fact_exists("PossibleWumpus", x, y) and
+                not (self.query("SafePit", x, y) and self.query("SafeWumpus", x, y)) and
+                not self.has_percept_conflict(x, y, "PossibleWumpus", "Stench", "NoStench") and
+                not self.query("Wumpus", x, y))
 
     def logic_inference_forward_chaining(self):
         while True:
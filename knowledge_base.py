@@ -1,10 +1,51 @@
-from const import DX, DY
+from topology import get_topology
+from safe_regions import SafeRegions
+from fire_lines import FireLines
 
 class KnowledgeBase:
+    # How far from a changed fact fact_exists answers can change.
+    change_radius = 0
+
     def __init__(self, N):
         self.N = N
-        self.facts = set()
+        self.topology = get_topology(N)
+        self.init_facts()
         self.visited = set()
+        self.listeners = []
+        self.version = 0
+        self.safe_regions = SafeRegions(self)
+        self.fire_lines = FireLines(self)
+
+    def init_facts(self):
+        self.facts = set()
+        self.index = {}
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def notify(self, name, x, y, added):
+        self.version += 1
+        for callback in self.listeners:
+            callback(name, x, y, added)
+
+    def mark_visited(self, x, y):
+        # Reported to listeners as a "Visited" change; it is not a fact.
+        if (x, y) not in self.visited:
+            self.visited.add((x, y))
+            self.notify("Visited", x, y, True)
+
+    def all_wumpuses_killed(self):
+        # A global flag, kept as one fact at (0,0).
+        return self.fact_exists("AllWumpusesKilled", 0, 0)
+
+    def same_safe_region(self, a, b):
+        return self.safe_regions.connected(a[0], a[1], b[0], b[1])
+
+    def wumpus_in_line(self, x, y, direction):
+        return self.fire_lines.wumpus_in_line(x, y, direction)
+
+    def shooting_positions(self):
+        return self.fire_lines.shooting_positions()
 
     def fact_str(self, name, x, y):
         return f"{name}({x},{y})"
@@ -13,6 +54,11 @@ class KnowledgeBase:
         f = self.fact_str(name, x, y)
         if f not in self.facts:
             self.facts.add(f)
+            cells = self.index.get(name)
+            if cells is None:
+                cells = self.index[name] = set()
+            cells.add((x, y))
+            self.notify(name, x, y, True)
             return True
         return False
 
@@ -20,6 +66,8 @@ class KnowledgeBase:
         f = self.fact_str(name, x, y)
         if f in self.facts:
             self.facts.remove(f)
+            self.index[name].discard((x, y))
+            self.notify(name, x, y, False)
             return True
         return False
 
@@ -27,23 +75,13 @@ class KnowledgeBase:
         return self.fact_str(name, x, y) in self.facts
 
     def iter_facts_of(self, name):
-        prefix = f"{name}("
-        for f in list(self.facts):
-            if f.startswith(prefix) and f.endswith(")"):
-                inside = f[len(prefix):-1]
-                try:
-                    xs, ys = inside.split(",")
-                    yield (int(xs), int(ys))
-                except Exception:
-                    continue
+        cells = self.index.get(name)
+        if not cells:
+            return iter(())
+        return iter(list(cells))
 
     def get_adjacent(self, x, y):
-        neighbors = []
-        for d in ['N', 'E', 'S', 'W']:
-            nx, ny = x + DX[d], y + DY[d]
-            if 0 <= nx < self.N and 0 <= ny < self.N:
-                neighbors.append((nx, ny))
-        return neighbors
+        return self.topology.neighbors(x, y)
 
     def get_map_status(self):
         map_status = []
@@ -84,3 +122,108 @@ class KnowledgeBase:
                     "status": status
                 })
         return map_status
+
+
+class VisitedBitset:
+    def __init__(self, N):
+        self.N = N
+        self.bits = bytearray(N * N)
+        self.count = 0
+
+    def add(self, cell):
+        x, y = cell
+        i = y * self.N + x
+        if not self.bits[i]:
+            self.bits[i] = 1
+            self.count += 1
+
+    def discard(self, cell):
+        x, y = cell
+        if 0 <= x < self.N and 0 <= y < self.N:
+            i = y * self.N + x
+            if self.bits[i]:
+                self.bits[i] = 0
+                self.count -= 1
+
+    def remove(self, cell):
+        if cell not in self:
+            raise KeyError(cell)
+        self.discard(cell)
+
+    def __contains__(self, cell):
+        x, y = cell
+        return 0 <= x < self.N and 0 <= y < self.N and self.bits[y * self.N + x] == 1
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        bits = bytes(self.bits)
+        i = bits.find(1)
+        while i != -1:
+            yield (i % self.N, i // self.N)
+            i = bits.find(1, i + 1)
+
+
+class BitboardKnowledgeBase(KnowledgeBase):
+    # One bytearray plane per predicate, indexed by y * N + x, instead of
+    # formatted fact strings. Same API as KnowledgeBase.
+    def __init__(self, N):
+        super().__init__(N)
+        self.visited = VisitedBitset(N)
+
+    def init_facts(self):
+        self.planes = {}
+
+    # The string facts and per-predicate index, built from the planes for
+    # code that reads them directly.
+    @property
+    def facts(self):
+        return {self.fact_str(name, x, y) for name in self.planes for x, y in self.iter_facts_of(name)}
+
+    @property
+    def index(self):
+        return {name: set(self.iter_facts_of(name)) for name in self.planes}
+
+    def plane(self, name):
+        p = self.planes.get(name)
+        if p is None:
+            p = bytearray(self.N * self.N)
+            self.planes[name] = p
+        return p
+
+    def add_fact(self, name, x, y):
+        if not (0 <= x < self.N and 0 <= y < self.N):
+            return False
+        p = self.plane(name)
+        i = y * self.N + x
+        if p[i]:
+            return False
+        p[i] = 1
+        self.notify(name, x, y, True)
+        return True
+
+    def remove_fact(self, name, x, y):
+        p = self.planes.get(name)
+        if p is None or not (0 <= x < self.N and 0 <= y < self.N):
+            return False
+        i = y * self.N + x
+        if not p[i]:
+            return False
+        p[i] = 0
+        self.notify(name, x, y, False)
+        return True
+
+    def fact_exists(self, name, x, y):
+        p = self.planes.get(name)
+        return p is not None and 0 <= x < self.N and 0 <= y < self.N and p[y * self.N + x] == 1
+
+    def iter_facts_of(self, name):
+        p = self.planes.get(name)
+        if p is None:
+            return
+        bits = bytes(p)
+        i = bits.find(1)
+        while i != -1:
+            yield (i % self.N, i // self.N)
+            i = bits.find(1, i + 1)
@@ -1,9 +1,11 @@
-import time
+import random
+from concurrent.futures import ProcessPoolExecutor
 from agent import Agent
-from environment import Environment
+from environment import Environment, PIT, WUMPUS
 from random_agent import RandomAgent
 from moving_wumpus_environment import MovingWumpusEnvironment
 from adaptive_agent import AdaptiveAgent
+from simulator import Simulator, MovingWumpusSimulator, ConsoleObserver, MovingWumpusConsole
 
 def get_user_configuration():
     while True:
@@ -18,68 +20,11 @@ def get_user_configuration():
     
     return N, K, p, mode
 
-def run_autonomous_mode(env, agent, agent_type="Intelligent"):
-    step_count = 0
-    max_steps = 300
+def run_autonomous_mode(env, agent, agent_type="Intelligent", delay=0.5):
     print(f"Starting {agent_type.lower()} agent!")
 
-    while step_count < max_steps:
-        step_count += 1
-        print(f"\n-Step {step_count}")
-
-        print("Real Environment:")
-        env.print_map()
-        
-        percepts = env.env_get_percepts()
-        
-        agent.Agent_get_percepts(percepts)
-        
-        print(f"\n{agent_type} Agent's Knowledge:")
-        agent.print_agent_map(env.N, env.N, env.agent_x, env.agent_y)
-        current_score = agent.currentScore()
-        print(f"\nCurrent Score: {current_score} | Gold: {'Yes' if agent.has_gold else 'No'}")
-
-        action = agent.choose_action()
-        print(f"\n{agent_type} Agent chooses action: {action}")
-        
-        if action == "FORWARD":
-            died, bump = env.move_forward()
-            agent.move_forward_action()
-            if died:
-                agent.die_action()
-                print("GAME OVER! Agent died!")
-                break
-            if bump:
-                print("BUMP! Hit a wall!")
-        elif action == "LEFT":
-            env.turn_left()
-            agent.turn_action()
-        elif action == "RIGHT":
-            env.turn_right()
-            agent.turn_action()
-        elif action == "SHOOT":
-            if agent.shoot_action():
-                env.shoot()
-                if env.scream:
-                    print("SCREAM! Wumpus killed!")
-                else:
-                    print("Arrow shot, but no scream...")
-        elif action == "GRAB":
-            if agent.grab_gold_action():
-                env.grab_gold()
-            else:
-                pass
-        elif action == "CLIMB":
-            if agent.climb_action():
-                if env.climb():
-                    current_score = agent.currentScore()
-                    print(f"FINAL SCORE: {current_score}")
-                    break
-            else:
-                if env.agent_x != 0 or env.agent_y != 0:
-                    print("Can only climb at starting position (0,0)!")
-        
-        time.sleep(0.5)
+    result = Simulator(env, agent, observers=[ConsoleObserver(agent_type, delay)]).run()
+    step_count = result.steps
 
     current_score = agent.currentScore()
     print(f"- {agent_type} agent:")
@@ -95,65 +40,71 @@ def run_autonomous_mode(env, agent, agent_type="Intelligent"):
     
     return current_score, step_count, agent.has_gold, (env.agent_x == 0 and env.agent_y == 0)
 
-def run_comparison_experiment(N, K, p, num_trials=10):
+def trial_summary(result):
+    return {
+        'score': result.score,
+        'steps': result.steps,
+        'has_gold': result.has_gold,
+        'success': result.success,
+        'survived': result.score > -1000
+    }
+
+def run_comparison_trial(N, K, p, seed):
+    # One trial of the comparison, played from its own seed so the result
+    # does not depend on which process runs it or in what order. The
+    # simulators have no observers, so the trial prints nothing; the caller
+    # prints a line per trial.
+    # The world and the random agent draw from the module-level generator,
+    # so it is seeded for the trial and the caller's state put back after.
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        # Create one environment that both agents will face
+        shared_env_config = Environment(N=N, K=K, p=p)
+
+        env_intelligent = Environment(N=N, K=K, p=p)
+        # Copy the grid state from shared environment
+        env_intelligent.load_world(shared_env_config)
+        intelligent = trial_summary(Simulator(env_intelligent, Agent(N, K)).run())
+
+        env_random = Environment(N=N, K=K, p=p)
+        # Copy the same grid state to random agent environment
+        env_random.load_world(shared_env_config)
+        random_result = trial_summary(Simulator(env_random, RandomAgent(N, K)).run())
+    finally:
+        random.setstate(state)
+
+    return shared_env_config.count(PIT), shared_env_config.count(WUMPUS), intelligent, random_result
+
+def run_comparison_experiment(N, K, p, num_trials=10, workers=1, seed=None):
     print(f"- Agent comparison:")
     print(f"Config: {N}x{N} map, {K} wumpuses, {p} pit density")
     print(f"Running {num_trials} trials for each agent")
     
     intelligent_results = []
     random_results = []
-    
-    for trial in range(num_trials):
+
+    # Trial seeds come from seed, or from the global generator when it is
+    # None, so the same seed gives the same trials for any worker count.
+    seeder = random.Random(seed) if seed is not None else random
+    seeds = [seeder.getrandbits(64) for _ in range(num_trials)]
+    args = ([N] * num_trials, [K] * num_trials, [p] * num_trials, seeds)
+    if workers <= 1:
+        trials = list(map(run_comparison_trial, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            trials = list(pool.map(run_comparison_trial, *args,
+                                   chunksize=max(1, num_trials // (workers * 4))))
+
+    for trial, (pit_count, wumpus_count, intelligent, random_result) in enumerate(trials):
         print(f"\nTrial {trial + 1}/{num_trials}")
         print("-" * 40)
-        
-        # Create one environment that both agents will face
-        shared_env_config = Environment(N=N, K=K, p=p)
-        
-        # Count pits and wumpuses for display
-        pit_count = sum(1 for y in range(N) for x in range(N) if shared_env_config.grid[y][x].pit)
-        wumpus_count = sum(1 for y in range(N) for x in range(N) if shared_env_config.grid[y][x].wumpus)
         print(f"Generated shared environment: {pit_count} pits, {wumpus_count} wumpuses")
-        
-        print(f"Testing Intelligent Agent...")
-        env_intelligent = Environment(N=N, K=K, p=p)
-        # Copy the grid state from shared environment
-        for y in range(N):
-            for x in range(N):
-                env_intelligent.grid[y][x].pit = shared_env_config.grid[y][x].pit
-                env_intelligent.grid[y][x].wumpus = shared_env_config.grid[y][x].wumpus
-                env_intelligent.grid[y][x].gold = shared_env_config.grid[y][x].gold
-        
-        agent_intelligent = Agent(N, K)
-        score_i, steps_i, has_gold_i, climbed_i = run_autonomous_mode(env_intelligent, agent_intelligent, "Intelligent")
-        intelligent_results.append({
-            'score': score_i,
-            'steps': steps_i,
-            'has_gold': has_gold_i,
-            'success': has_gold_i and climbed_i,
-            'survived': score_i > -1000
-        })
-        
-        print(f"\n" + "-" * 40)
-        
-        print(f"Testing Random Agent on SAME environment...")
-        env_random = Environment(N=N, K=K, p=p)
-        # Copy the same grid state to random agent environment
-        for y in range(N):
-            for x in range(N):
-                env_random.grid[y][x].pit = shared_env_config.grid[y][x].pit
-                env_random.grid[y][x].wumpus = shared_env_config.grid[y][x].wumpus
-                env_random.grid[y][x].gold = shared_env_config.grid[y][x].gold
-        
-        agent_random = RandomAgent(N, K)
-        score_r, steps_r, has_gold_r, climbed_r = run_autonomous_mode(env_random, agent_random, "Random")
-        random_results.append({
-            'score': score_r,
-            'steps': steps_r,
-            'has_gold': has_gold_r,
-            'success': has_gold_r and climbed_r,
-            'survived': score_r > -1000
-        })
+        print(f"Intelligent Agent: score {intelligent['score']}, {intelligent['steps']} steps")
+        print(f"Random Agent on SAME environment: score {random_result['score']}, {random_result['steps']} steps")
+        intelligent_results.append(intelligent)
+        random_results.append(random_result)
+
     i_scores = [r['score'] for r in intelligent_results]
     i_steps = [r['steps'] for r in intelligent_results]
     i_success_rate = sum(r['success'] for r in intelligent_results) / num_trials * 100
@@ -194,104 +145,13 @@ def run_comparison_experiment(N, K, p, num_trials=10):
     
     return intelligent_results, random_results
 
-def run_moving_wumpus_mode(env, agent):
-    step_count = 0
-    max_steps = 300
+def run_moving_wumpus_mode(env, agent, delay=0.7):
     print(f"Starting Adaptive agent in Moving Wumpus mode!")
     print("WARNING: Wumpuses move every 5 actions - previous knowledge may become outdated!")
 
-    while step_count < max_steps:
-        step_count += 1
-        print(f"\n--- Step {step_count} ---")
-
-        print("Real Environment:")
-        env.print_map()
-        
-        percepts = env.env_get_percepts()
-        
-        agent.Agent_get_percepts(percepts)
-        
-        wumpus_moved = agent.handle_wumpus_movement_phase(env.action_count)
-        
-        print(f"\nAdaptive Agent's Knowledge:")
-        agent.print_agent_map(env.N, env.N, env.agent_x, env.agent_y)
-        
-
-        action = agent.choose_action()
-        print(f"\nAdaptive Agent chooses action: {action}")
-        
-        agent_died = False
-        
-        if action == "FORWARD":
-            died, bump = env.move_forward()
-            agent.move_forward_action()
-            if died:
-                agent.die_action()
-                agent_died = True
-                if env.check_wumpus_collision():
-                    print("GAME OVER! Agent was eaten by a moving Wumpus!")
-                else:
-                    print("GAME OVER! Agent died!")
-                break
-            if bump:
-                print("BUMP! Hit a wall!")
-                
-        elif action == "LEFT":
-            died = env.turn_left()
-            agent.turn_action()
-            if died:
-                agent.die_action()
-                print("GAME OVER! Agent was eaten by a moving Wumpus!")
-                break
-            print("Turned left")
-            
-        elif action == "RIGHT":
-            died = env.turn_right()
-            agent.turn_action()
-            if died:
-                agent.die_action()
-                print("GAME OVER! Agent was eaten by a moving Wumpus!")
-                break
-            print("Turned right")
-            
-        elif action == "SHOOT":
-            if agent.shoot_action():
-                died = env.shoot()
-                if died:
-                    agent.die_action()
-                    print("GAME OVER! Agent was eaten by a moving Wumpus!")
-                    break
-                if env.scream:
-                    print("SCREAM! Wumpus killed!")
-                    if hasattr(agent, 'inference_engine'):
-                        agent.inference_engine.handle_shoot(env.agent_x, env.agent_y, env.agent_dir)
-                else:
-                    print("Arrow shot, but no scream...")
-                    
-        elif action == "GRAB":
-            if agent.grab_gold_action():
-                env.grab_gold()
-                if env.check_wumpus_collision():
-                    agent.die_action()
-                    print("GAME OVER! Agent was eaten by a moving Wumpus during grab!")
-                    break
-                    
-        elif action == "CLIMB":
-            if agent.climb_action():
-                if env.climb():
-                    current_score = agent.currentScore()
-                    print("MISSION COMPLETE! Agent successfully escaped with the gold!")
-                    print(f"FINAL SCORE: {current_score}")
-                    break
-            else:
-                if env.agent_x != 0 or env.agent_y != 0:
-                    print("Can only climb at starting position (0,0)!")
-                    
-        if env.action_count % 5 == 0 and hasattr(agent, 'inference_engine'):
-            print("Re-running inference after Wumpus movement...")
-            agent.inference_engine.logic_inference_forward_chaining()
-        
-        time.sleep(0.7)
+    result = MovingWumpusSimulator(env, agent, observers=[MovingWumpusConsole(delay)]).run()
+    step_count = result.steps
+    agent_died = result.died
 
     current_score = agent.currentScore()
     print(f"-Adaptive Agent - Moving Wumpus Mode:")
@@ -339,7 +199,8 @@ if __name__ == "__main__":
     elif mode == '3':
         print(f"Mode: Agent Comparison Experiment")
         num_trials = int(input("Enter number of trials per agent (default 5): ") or 5)
-        run_comparison_experiment(N, K, p, num_trials)
+        workers = int(input("Enter number of worker processes (default 1): ") or 1)
+        run_comparison_experiment(N, K, p, num_trials, workers)
     elif mode == '4':
         print(f"Mode: Moving Wumpus Mode")
         env = MovingWumpusEnvironment(N=N, K=K, p=p)
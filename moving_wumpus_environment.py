@@ -1,6 +1,5 @@
 import random
-from const import DX, DY
-from environment import Environment
+from environment import Environment, PIT, WUMPUS
 
 class MovingWumpusEnvironment(Environment):
     
@@ -11,23 +10,22 @@ class MovingWumpusEnvironment(Environment):
         
         self.update_wumpus_locations()
         
-        print(f"- Moving Wumpus Environment Initialized:")
-        print(f"+ Wumpuses move every 5 agent actions")
-        print(f"+ Current Wumpus locations: {self.wumpus_locations}")
+        if self.log:
+            self.log(f"- Moving Wumpus Environment Initialized:")
+            self.log(f"+ Wumpuses move every 5 agent actions")
+            self.log(f"+ Current Wumpus locations: {self.wumpus_locations}")
     
     def update_wumpus_locations(self):
-        self.wumpus_locations = []
-        for y in range(self.N):
-            for x in range(self.N):
-                if self.grid[y][x].wumpus:
-                    self.wumpus_locations.append((x, y))
+        self.wumpus_locations = [(i % self.N, i // self.N) for i, cell in enumerate(self.cells) if cell & WUMPUS]
     
     def increment_action_count(self):
         self.action_count += 1
-        print(f"Action count: {self.action_count}")
+        if self.log:
+            self.log(f"Action count: {self.action_count}")
         
         if self.action_count % 5 == 0:
-            print(f"\nWUMPUS MOVEMENT PHASE (after {self.action_count} actions)")
+            if self.log:
+                self.log(f"\nWUMPUS MOVEMENT PHASE (after {self.action_count} actions)")
             self.move_all_wumpuses()
             return True  
         return False
@@ -35,13 +33,8 @@ class MovingWumpusEnvironment(Environment):
     def get_valid_wumpus_moves(self, wx, wy):
         valid_moves = [] 
         
-        for direction in ['N', 'E', 'S', 'W']:
-            nx, ny = wx + DX[direction], wy + DY[direction]
-            
-            if not (0 <= nx < self.N and 0 <= ny < self.N):
-                continue
-            
-            if self.grid[ny][nx].pit:
+        for nx, ny in self.get_adjacent(wx, wy):
+            if self.has(nx, ny, PIT):
                 continue
             
             if any((nx, ny) == (ox, oy) for (ox, oy) in self.wumpus_locations if (ox, oy) != (wx, wy)):
@@ -55,12 +48,14 @@ class MovingWumpusEnvironment(Environment):
         valid_moves = self.get_valid_wumpus_moves(wx, wy)
         new_x, new_y = wx, wy
         if len(valid_moves) == 0:
-            print(f"   Wumpus at ({wx},{wy}) stayed in place")
+            if self.log:
+                self.log(f"   Wumpus at ({wx},{wy}) stayed in place")
         else:
             new_x, new_y = random.choice(valid_moves)
-            self.grid[wy][wx].wumpus = False
-            self.grid[new_y][new_x].wumpus = True
-            print(f"   Wumpus moved from ({wx},{wy}) to ({new_x},{new_y})")
+            self.set_flag(wx, wy, WUMPUS, False)
+            self.set_flag(new_x, new_y, WUMPUS, True)
+            if self.log:
+                self.log(f"   Wumpus moved from ({wx},{wy}) to ({new_x},{new_y})")
         return new_x, new_y
     
     def move_all_wumpuses(self):
@@ -75,10 +70,12 @@ class MovingWumpusEnvironment(Environment):
         
         agent_pos = (self.agent_x, self.agent_y)
         if agent_pos in self.wumpus_locations:
-            print(f"COLLISION! Wumpus moved into agent's cell {agent_pos}")
+            if self.log:
+                self.log(f"COLLISION! Wumpus moved into agent's cell {agent_pos}")
             return True 
         
-        print(f"   New Wumpus locations: {self.wumpus_locations}")
+        if self.log:
+            self.log(f"   New Wumpus locations: {self.wumpus_locations}")
         return False  
     
     def move_forward(self):
@@ -103,7 +100,8 @@ class MovingWumpusEnvironment(Environment):
         if wumpus_moved:
             collision = self.check_wumpus_collision()
             if collision:
-                print("YOU DIED! Wumpus moved into your location!")
+                if self.log:
+                    self.log("YOU DIED! Wumpus moved into your location!")
                 return True  
         return False
     
@@ -114,7 +112,8 @@ class MovingWumpusEnvironment(Environment):
         if wumpus_moved:
             collision = self.check_wumpus_collision()
             if collision:
-                print("YOU DIED! Wumpus moved into your location!")
+                if self.log:
+                    self.log("YOU DIED! Wumpus moved into your location!")
                 return True  
         return False
     
@@ -127,7 +126,8 @@ class MovingWumpusEnvironment(Environment):
         if wumpus_moved:
             collision = self.check_wumpus_collision()
             if collision:
-                print("YOU DIED! Wumpus moved into your location!")
+                if self.log:
+                    self.log("YOU DIED! Wumpus moved into your location!")
                 return True  
         return False
     
@@ -138,7 +138,8 @@ class MovingWumpusEnvironment(Environment):
         if wumpus_moved:
             collision = self.check_wumpus_collision()
             if collision:
-                print("YOU DIED! Wumpus moved into your location!")
+                if self.log:
+                    self.log("YOU DIED! Wumpus moved into your location!")
                 return result  
         return result
     
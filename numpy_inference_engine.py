@@ -0,0 +1,129 @@
+from inference_engine import InferenceEngine
+from knowledge_base import KnowledgeBase
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PREDICATES = [
+    "Safe", "SafePit", "SafeWumpus", "PossiblePit", "PossibleWumpus",
+    "Pit", "Wumpus", "Breeze", "NoBreeze", "Stench", "NoStench",
+]
+
+# Grids are indexed [y, x], the same layout as BitboardKnowledgeBase planes.
+def neighbor_count(grid):
+    count = np.zeros(grid.shape, dtype=np.int8)
+    count[1:, :] += grid[:-1, :]
+    count[:-1, :] += grid[1:, :]
+    count[:, 1:] += grid[:, :-1]
+    count[:, :-1] += grid[:, 1:]
+    return count
+
+def neighbor_any(grid):
+    result = np.zeros(grid.shape, dtype=bool)
+    result[1:, :] |= grid[:-1, :]
+    result[:-1, :] |= grid[1:, :]
+    result[:, 1:] |= grid[:, :-1]
+    result[:, :-1] |= grid[:, 1:]
+    return result
+
+class NumpyInferenceEngine(InferenceEngine):
+    # Runs the forward-chaining rules as whole-grid boolean array operations.
+    # InferenceEngine stays the reference implementation; cross_check=True
+    # re-runs it on a copy of the knowledge base after every fixpoint.
+    def __init__(self, knowledge_base, cross_check=False):
+        if np is None:
+            raise ImportError("NumpyInferenceEngine requires numpy (pip install numpy)")
+        super().__init__(knowledge_base)
+        self.cross_check = cross_check
+
+    def load_grids(self):
+        N = self.kb.N
+        planes = getattr(self.kb, "planes", None)
+        grids = {}
+        for name in PREDICATES:
+            if planes is not None:
+                plane = planes.get(name)
+                if plane is None:
+                    grids[name] = np.zeros((N, N), dtype=bool)
+                else:
+                    grids[name] = np.frombuffer(plane, dtype=np.uint8).reshape(N, N).astype(bool)
+                continue
+            grid = np.zeros((N, N), dtype=bool)
+            cells = list(self.kb.iter_facts_of(name))
+            if cells:
+                xs, ys = zip(*cells)
+                grid[list(ys), list(xs)] = True
+            grids[name] = grid
+        return grids
+
+    def store_grids(self, old, new):
+        added_facts = []
+        for name in PREDICATES:
+            added = new[name] & ~old[name]
+            removed = old[name] & ~new[name]
+            for y, x in zip(*np.nonzero(added)):
+                if self.kb.add_fact(name, int(x), int(y)):
+                    added_facts.append((name, int(x), int(y)))
+            for y, x in zip(*np.nonzero(removed)):
+                self.kb.remove_fact(name, int(x), int(y))
+        # Record justifications once the knowledge base is complete.
+        for fact in added_facts:
+            self.tms.justify(fact, self.explain(*fact))
+
+    def array_safecombination(self, g):
+        both = g["SafePit"] & g["SafeWumpus"]
+        g["Safe"] = g["Safe"] | both
+        g["PossiblePit"] = g["PossiblePit"] & ~both
+        g["PossibleWumpus"] = g["PossibleWumpus"] & ~both
+
+    def array_eliminate_by_conflict(self, g, possible, safe, percept, no_percept):
+        conflict = g[possible] & neighbor_any(g[percept]) & neighbor_any(g[no_percept])
+        g[safe] = g[safe] | conflict
+        g[possible] = g[possible] & ~conflict
+
+    def array_confirm_single_unknown(self, g, percept, safe, confirmed, possible):
+        unknown = ~g[safe]
+        single = g[percept] & (neighbor_count(unknown) == 1)
+        target = neighbor_any(single) & unknown
+        g[confirmed] = g[confirmed] | target
+        g[safe] = g[safe] & ~target
+        g[possible] = g[possible] & ~target
+
+    def run_array_rules(self, g):
+        while True:
+            before = {name: grid.copy() for name, grid in g.items()}
+            self.array_safecombination(g)
+            self.array_eliminate_by_conflict(g, "PossiblePit", "SafePit", "Breeze", "NoBreeze")
+            self.array_eliminate_by_conflict(g, "PossibleWumpus", "SafeWumpus", "Stench", "NoStench")
+            self.array_confirm_single_unknown(g, "Breeze", "SafePit", "Pit", "PossiblePit")
+            self.array_confirm_single_unknown(g, "Stench", "SafeWumpus", "Wumpus", "PossibleWumpus")
+            if all(np.array_equal(before[name], g[name]) for name in g):
+                return g
+
+    def reference_mismatches(self, grids):
+        reference_kb = KnowledgeBase(self.kb.N)
+        for name in PREDICATES:
+            for x, y in self.kb.iter_facts_of(name):
+                reference_kb.add_fact(name, x, y)
+        InferenceEngine(reference_kb).logic_inference_forward_chaining()
+
+        mismatches = []
+        for name in PREDICATES:
+            for y, x in zip(*np.nonzero(grids[name])):
+                if not reference_kb.fact_exists(name, int(x), int(y)):
+                    mismatches.append(f"extra {name}({x},{y})")
+            for x, y in reference_kb.iter_facts_of(name):
+                if not grids[name][y, x]:
+                    mismatches.append(f"missing {name}({x},{y})")
+        return mismatches
+
+    def logic_inference_forward_chaining(self):
+        old = self.load_grids()
+        new = self.run_array_rules({name: grid.copy() for name, grid in old.items()})
+        if self.cross_check:
+            mismatches = self.reference_mismatches(new)
+            if mismatches:
+                raise RuntimeError(f"NumPy backend disagrees with the reference engine: {mismatches[:10]}")
+        self.store_grids(old, new)
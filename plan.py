@@ -0,0 +1,17 @@
+class Plan:
+    # Actions the planner has committed to, each with the agent state it
+    # expects beforehand, and the cells whose facts the plan was derived
+    # from. The planner drops the plan when one of those cells changes.
+    def __init__(self, steps, cells):
+        self.steps = steps
+        self.cells = cells
+        self.position = 0
+
+    def next_action(self, x, y, direction):
+        if self.position >= len(self.steps):
+            return None
+        expected, action = self.steps[self.position]
+        if expected != (x, y, direction):
+            return None
+        self.position += 1
+        return action
@@ -1,12 +1,73 @@
 import heapq
 from const import DIRECTIONS, DX, DY
+from topology import DIRECTION_INDEX, LEFT_OF, RIGHT_OF, TURNS, get_topology
 from typing import List, Tuple, Optional, Set
+from home_distance_field import HomeDistanceField
+from plan import Plan
+from exploration_frontier import ExplorationFrontier
+from decision_cache import DecisionCache
+
+# Rank of each direction letter in alphabetical order.
+DIRECTION_ORDER = {d: i for i, d in enumerate(sorted(DIRECTIONS))}
+
 class PlanningModule:
-    def __init__(self, knowledge_base, N):
+    # Messages go through log, which the agent's Simulator sets.
+    log = print
+
+    def __init__(self, knowledge_base, N, probability_engine=None, decision_cache_size: int = 0):
         self.kb = knowledge_base
         self.N = N
-        
+        self.topology = get_topology(N)
+        self.probability_engine = probability_engine
+        # Risk of each cell, computed on first use and kept until a fact
+        # close enough to affect it changes.
+        self.risk_grid: List[Optional[float]] = [None] * (N * N)
+        self.changed_cells: Set[Tuple[int, int]] = set()
+        self.kb.add_listener(self.on_fact_changed)
+        self.home_fields = {}
+        self.frontier = ExplorationFrontier(self)
+        # Optional memo of the moves decided from the agent's neighbours alone.
+        self.decision_cache = DecisionCache(self, decision_cache_size) if decision_cache_size > 0 else None
+        self.plan: Optional[Plan] = None
+        self.route: Optional[List[Tuple[int, int, str]]] = None
+        self.sweep: Optional[Tuple[Tuple[int, int], Tuple[List[float], List[int], List[int], List[int]]]] = None
+    
+    def on_fact_changed(self, name: str, x: int, y: int, added: bool) -> None:
+        self.changed_cells.add((x, y))
+        if self.plan is not None and (self.probability_engine is not None or (x, y) in self.plan.cells):
+            self.plan = None
+    
+    def apply_changes(self) -> None:
+        if self.probability_engine is not None:
+            # Probabilities depend on the whole frontier.
+            self.risk_grid = [None] * (self.N * self.N)
+        else:
+            for x, y in self.affected_cells(self.changed_cells):
+                self.risk_grid[y * self.N + x] = None
+        self.changed_cells.clear()
+    
+    def affected_cells(self, changed_cells: Set[Tuple[int, int]]):
+        # Cells whose risk a change at changed_cells can alter: a cell's risk
+        # reads its own facts and its neighbours' percepts.
+        radius = self.kb.change_radius + 1
+        for x, y in changed_cells:
+            for dy in range(-radius, radius + 1):
+                ny = y + dy
+                if not 0 <= ny < self.N:
+                    continue
+                span = radius - abs(dy)
+                for nx in range(max(x - span, 0), min(x + span, self.N - 1) + 1):
+                    yield nx, ny
+    
     def calculate_cell_risk(self, x: int, y: int) -> float:
+        if self.changed_cells:
+            self.apply_changes()
+        risk = self.risk_grid[y * self.N + x]
+        if risk is None:
+            risk = self.risk_grid[y * self.N + x] = self.compute_cell_risk(x, y)
+        return risk
+        
+    def compute_cell_risk(self, x: int, y: int) -> float:
         if (x, y) in self.kb.visited and self.kb.fact_exists("Safe", x, y):
             return 0.0
             
@@ -14,13 +75,19 @@ class PlanningModule:
             return float('inf')
         if self.kb.fact_exists("Wumpus", x, y):
             return float('inf')
+
+        if self.probability_engine is not None:
+            # Expected deaths per thousand entries, so the fixed thresholds
+            # below keep their meaning.
+            death = self.probability_engine.death_probability(x, y)
+            return float('inf') if death >= 1.0 else 1000.0 * death
             
         risk = 0.0
         if self.kb.fact_exists("PossiblePit", x, y):
             return 1000.0
         
         if self.kb.fact_exists("PossibleWumpus", x, y):
-            if self.kb.fact_exists("AllWumpusesKilled", x, y):
+            if self.kb.all_wumpuses_killed():
                 risk += 0.0
             else:
                 return 800.0
@@ -31,8 +98,7 @@ class PlanningModule:
                 if self.kb.fact_exists("Breeze", adj_x, adj_y):
                     adjacent_to_danger = True
                     break
-                elif (self.kb.fact_exists("Stench", adj_x, adj_y) and 
-                      not self.kb.fact_exists("AllWumpusesKilled"), adj_x, adj_y):
+                elif self.kb.fact_exists("Stench", adj_x, adj_y) and not self.kb.all_wumpuses_killed():
                     adjacent_to_danger = True
                     break
             
@@ -60,16 +126,12 @@ class PlanningModule:
             
         return utility
     
-    def calculate_movement_cost(self, from_x: int, from_y: int, to_x: int, to_y: int, 
-                              current_dir: str, target_dir: str) -> float:
+    def turn_cost(self, current_dir: str, target_dir: str) -> float:
+        return TURNS[current_dir][target_dir]
+    
+    def entry_cost(self, to_x: int, to_y: int) -> float:
         base_cost = 1.0
         
-        if current_dir != target_dir:
-            current_idx = DIRECTIONS.index(current_dir)
-            target_idx = DIRECTIONS.index(target_dir)
-            turns = min(abs(target_idx - current_idx), 4 - abs(target_idx - current_idx))
-            base_cost += turns
-            
         risk = self.calculate_cell_risk(to_x, to_y)
         if risk == float('inf'):
             return float('inf')
@@ -81,6 +143,10 @@ class PlanningModule:
             
         return base_cost
     
+    def calculate_movement_cost(self, from_x: int, from_y: int, to_x: int, to_y: int, 
+                              current_dir: str, target_dir: str) -> float:
+        return self.turn_cost(current_dir, target_dir) + self.entry_cost(to_x, to_y)
+    
     def get_direction_to_move(self, from_x: int, from_y: int, to_x: int, to_y: int) -> str:
         dx = to_x - from_x
         dy = to_y - from_y
@@ -99,113 +165,171 @@ class PlanningModule:
     def heuristic(self, x: int, y: int, goal_x: int, goal_y: int) -> float:
         return abs(x - goal_x) + abs(y - goal_y)
     
+    def encode_state(self, x: int, y: int, direction: str) -> int:
+        return (y * self.N + x) * 4 + DIRECTION_INDEX[direction]
+    
+    def decode_state(self, state: int) -> Tuple[int, int, str]:
+        cell, d = divmod(state, 4)
+        y, x = divmod(cell, self.N)
+        return x, y, DIRECTIONS[d]
+    
+    def tie_break(self, x: int, y: int, direction: str) -> int:
+        # Orders heap entries like the (x, y, direction) tuples did.
+        return (x * self.N + y) * 4 + DIRECTION_ORDER[direction]
+    
+    def successors(self, state: int, risk_limit: Optional[float], closed_cells: Optional[bytearray] = None):
+        x, y, direction = self.decode_state(state)
+        for next_dir, nx, ny in self.topology.moves(x, y):
+            if closed_cells is not None and closed_cells[ny * self.N + nx]:
+                continue
+            
+            if risk_limit is not None:
+                risk = self.calculate_cell_risk(nx, ny)
+                if risk == float('inf') or risk > risk_limit:
+                    continue
+            
+            move_cost = self.calculate_movement_cost(x, y, nx, ny, direction, next_dir)
+            if move_cost == float('inf'):
+                continue
+            
+            yield (ny * self.N + nx) * 4 + DIRECTION_INDEX[next_dir], nx, ny, next_dir, move_cost
+    
+    def rebuild_path(self, parent: List[int], node: int, state_of: Optional[List[int]] = None) -> List[Tuple[int, int, str]]:
+        path = []
+        while node != -1:
+            path.append(self.decode_state(node if state_of is None else state_of[node]))
+            node = parent[node]
+        path.reverse()
+        return path
+    
     def a_star_search(self, start_x: int, start_y: int, goal_x: int, goal_y: int, 
                      current_dir: str, avoid_dangerous: bool = True) -> Optional[List[Tuple[int, int, str]]]:
-        open_set = [(0, 0, start_x, start_y, current_dir, [])]
-        closed_set: Set[Tuple[int, int, str]] = set()
-        
-        g_scores = {(start_x, start_y, current_dir): 0}
+        # States are (y*N + x)*4 + dir; the path is rebuilt from parent
+        # pointers once the goal is popped.
+        size = self.N * self.N * 4
+        g_scores = [float('inf')] * size
+        parent = [-1] * size
+        closed = bytearray(size)
+        
+        start = self.encode_state(start_x, start_y, current_dir)
+        g_scores[start] = 0
+        open_set = [(0, 0, self.tie_break(start_x, start_y, current_dir), start)]
+        risk_limit = 80 if avoid_dangerous else None
         
         while open_set:
-            f_score, g_score, x, y, direction, path = heapq.heappop(open_set)
+            f_score, g_score, _, state = heapq.heappop(open_set)
             
-            state = (x, y, direction)
-            if state in closed_set:
+            if closed[state]:
                 continue
-            closed_set.add(state)
+            closed[state] = 1
             
-            if x == goal_x and y == goal_y:
-                return path + [(x, y, direction)]
+            if state // 4 == goal_y * self.N + goal_x:
+                return self.rebuild_path(parent, state)
             
-            for next_dir in DIRECTIONS:
-                dx, dy = DX[next_dir], DY[next_dir]
-                nx, ny = x + dx, y + dy
-                
-                if not (0 <= nx < self.N and 0 <= ny < self.N):
-                    continue
-                
-                if avoid_dangerous:
-                    risk = self.calculate_cell_risk(nx, ny)
-                    if risk == float('inf'):
-                        continue
-                    if risk > 80:
-                        continue
-                
-                move_cost = self.calculate_movement_cost(x, y, nx, ny, direction, next_dir)
-                if move_cost == float('inf'):
+            for next_state, nx, ny, next_dir, move_cost in self.successors(state, risk_limit):
+                if closed[next_state]:
                     continue
                 
                 tentative_g = g_score + move_cost
-                next_state = (nx, ny, next_dir)
-                
-                if next_state in g_scores and tentative_g >= g_scores[next_state]:
+                if tentative_g >= g_scores[next_state]:
                     continue
                 
                 g_scores[next_state] = tentative_g
+                parent[next_state] = state
                 f_score = tentative_g + self.heuristic(nx, ny, goal_x, goal_y)
-                
-                new_path = path + [(x, y, direction)]
-                heapq.heappush(open_set, (f_score, tentative_g, nx, ny, next_dir, new_path))
+                heapq.heappush(open_set, (f_score, tentative_g, self.tie_break(nx, ny, next_dir), next_state))
         
         return None
     
-    def dijkstra_search(self, start_x: int, start_y: int, current_dir: str, 
-                       has_gold: bool = False) -> Optional[Tuple[int, int, List[Tuple[int, int, str]]]]:
-        open_set = [(0, 0, start_x, start_y, current_dir, [])]
-        visited: Set[Tuple[int, int]] = set()
-        
-        best_cell = None
-        best_ratio = float('-inf')
-        best_path = None
-        
+    def safe_sweep(self, start_x: int, start_y: int, current_dir: str) -> Tuple[List[float], List[int], List[int], List[int]]:
+        # Turn-aware cost from the agent's state to every state in the
+        # known-safe cells (visited or Safe), in one uniform-cost pass.
+        # Returns the cost and parent of each state, the cheapest state of
+        # each cell and the cells in the order they were settled. Every
+        # decision of a step reads the same table; it is rebuilt when the
+        # agent's state or the knowledge base changes.
+        start = self.encode_state(start_x, start_y, current_dir)
+        key = (start, self.kb.version)
+        if self.sweep is not None and self.sweep[0] == key:
+            return self.sweep[1]
+        
+        size = self.N * self.N * 4
+        g_scores = [float('inf')] * size
+        parent = [-1] * size
+        closed = bytearray(size)
+        cell_state = [-1] * (self.N * self.N)
+        order = []
+        
+        # Entry cost of each cell (inf outside the known-safe cells), priced once.
+        entry: List[Optional[float]] = [None] * (self.N * self.N)
+        turns = [[self.turn_cost(a, b) for b in DIRECTIONS] for a in DIRECTIONS]
+        
+        g_scores[start] = 0
+        open_set = [(0, self.tie_break(start_x, start_y, current_dir), start)]
         while open_set:
-            neg_ratio, cost, x, y, direction, path = heapq.heappop(open_set)
-            
-            if (x, y) in visited:
+            cost, _, state = heapq.heappop(open_set)
+            if closed[state]:
                 continue
-            visited.add((x, y))
-            
-            utility = self.calculate_cell_utility(x, y, has_gold)
-            ratio = utility / max(cost, 1)
-            
-            risk = self.calculate_cell_risk(x, y)
-            if utility > 0 and risk < 500:
-                if ratio > best_ratio:
-                    best_ratio = ratio
-                    best_cell = (x, y)
-                    best_path = path + [(x, y, direction)]
+            closed[state] = 1
+            cell, d = divmod(state, 4)
+            if cell_state[cell] == -1:
+                cell_state[cell] = state
+                order.append(cell)
             
-            for next_dir in DIRECTIONS:
-                dx, dy = DX[next_dir], DY[next_dir]
-                nx, ny = x + dx, y + dy
-                
-                if not (0 <= nx < self.N and 0 <= ny < self.N):
-                    continue
-                
-                if (nx, ny) in visited:
-                    continue
-                
-                risk = self.calculate_cell_risk(nx, ny)
-                if risk == float('inf'):
-                    continue
-                if risk > 500:
+            y, x = divmod(cell, self.N)
+            for next_dir, nx, ny in self.topology.moves(x, y):
+                nd = DIRECTION_INDEX[next_dir]
+                next_cell = ny * self.N + nx
+                entry_cost = entry[next_cell]
+                if entry_cost is None:
+                    if (nx, ny) in self.kb.visited or self.kb.fact_exists("Safe", nx, ny):
+                        entry_cost = self.entry_cost(nx, ny)
+                    else:
+                        entry_cost = float('inf')
+                    entry[next_cell] = entry_cost
+                if entry_cost == float('inf'):
                     continue
-                
-                move_cost = self.calculate_movement_cost(x, y, nx, ny, direction, next_dir)
-                if move_cost == float('inf'):
+                next_state = next_cell * 4 + nd
+                new_cost = cost + turns[d][nd] + entry_cost
+                if closed[next_state] or new_cost >= g_scores[next_state]:
                     continue
+                g_scores[next_state] = new_cost
+                parent[next_state] = state
+                heapq.heappush(open_set, (new_cost, self.tie_break(nx, ny, next_dir), next_state))
+        
+        table = (g_scores, parent, cell_state, order)
+        self.sweep = (key, table)
+        return table
+    
+    def safe_adjacent_moves(self, agent_x: int, agent_y: int) -> List[Tuple[int, int, str]]:
+        safe_adjacent = []
+        for next_dir, nx, ny in self.topology.moves(agent_x, agent_y):
+            if ((nx, ny) not in self.kb.visited and 
+                self.kb.fact_exists("Safe", nx, ny) and
+                not self.kb.fact_exists("PossiblePit", nx, ny) and
+                not self.kb.fact_exists("PossibleWumpus", nx, ny)):
+                safe_adjacent.append((nx, ny, next_dir))
+        return safe_adjacent
+    
+    def safe_unknown_moves(self, agent_x: int, agent_y: int) -> List[Tuple[int, int, str]]:
+        safe_unknown = []
+        for next_dir, nx, ny in self.topology.moves(agent_x, agent_y):
+            if ((nx, ny) not in self.kb.visited and
+                not self.kb.fact_exists("PossiblePit", nx, ny) and
+                not self.kb.fact_exists("PossibleWumpus", nx, ny) and
+                not self.kb.fact_exists("Pit", nx, ny) and
+                not self.kb.fact_exists("Wumpus", nx, ny)):
                 
-                new_cost = cost + move_cost
-                new_path = path + [(x, y, direction)]
-                
-                utility_estimate = self.calculate_cell_utility(nx, ny, has_gold)
-                estimated_ratio = utility_estimate / max(new_cost, 1)
+                is_safe_unknown = True
+                for adj_x, adj_y in self.kb.get_adjacent(nx, ny):
+                    if (self.kb.fact_exists("Breeze", adj_x, adj_y) or 
+                        self.kb.fact_exists("Stench", adj_x, adj_y)):
+                        is_safe_unknown = False
+                        break
                 
-                heapq.heappush(open_set, (-estimated_ratio, new_cost, nx, ny, next_dir, new_path))
-        
-        if best_cell:
-            return (best_cell[0], best_cell[1], best_path)
-        return None
+                if is_safe_unknown:
+                    safe_unknown.append((nx, ny, next_dir))
+        return safe_unknown
     
     def plan_optimal_action(self, agent_x: int, agent_y: int, agent_dir: str, 
                           has_gold: bool, has_shot: bool, current_score: int = 0) -> str:
@@ -213,11 +337,10 @@ class PlanningModule:
             return "CLIMB"
         
         if has_gold and (agent_x != 0 or agent_y != 0):
-            path = self.a_star_search(agent_x, agent_y, 0, 0, agent_dir, avoid_dangerous=True)
-            if path and len(path) > 1:
-                next_x, next_y, next_dir = path[1]
-                required_dir = self.get_direction_to_move(agent_x, agent_y, next_x, next_y)
-                
+            route = self.route_home(agent_x, agent_y, agent_dir, avoid_dangerous=True)
+            if len(route) > 1:
+                self.route = route
+                required_dir = route[1][2]
                 if agent_dir != required_dir:
                     return self._get_turn_action(agent_dir, required_dir)
                 else:
@@ -226,76 +349,40 @@ class PlanningModule:
         if not has_gold and self.kb.fact_exists("glitter", agent_x, agent_y):
             return "GRAB"
         
-        if not has_shot and not self.kb.fact_exists("AllWumpusesKilled", agent_x, agent_y):
-            dx, dy = DX[agent_dir], DY[agent_dir]
-            x, y = agent_x + dx, agent_y + dy
-            while 0 <= x < self.N and 0 <= y < self.N:
-                if self.kb.fact_exists("Wumpus", x, y):
-                    return "SHOOT"
-                if self.kb.fact_exists("Safe", x, y) and (x, y) in self.kb.visited:
-                    break
-                x += dx
-                y += dy
+        if self.should_shoot(agent_x, agent_y, agent_dir, has_shot):
+            return "SHOOT"
         
-        safe_adjacent = []
-        for next_dir in DIRECTIONS:
-            dx, dy = DX[next_dir], DY[next_dir]
-            nx, ny = agent_x + dx, agent_y + dy
-            
-            if 0 <= nx < self.N and 0 <= ny < self.N:
-                if ((nx, ny) not in self.kb.visited and 
-                    self.kb.fact_exists("Safe", nx, ny) and
-                    not self.kb.fact_exists("PossiblePit", nx, ny) and
-                    not self.kb.fact_exists("PossibleWumpus", nx, ny)):
-                    safe_adjacent.append((nx, ny, next_dir))
+        action = self.local_move(agent_x, agent_y, agent_dir)
+        if action is not None:
+            return action
         
-        if safe_adjacent:
-            nx, ny, required_dir = safe_adjacent[0]
+        # Walk to the nearest safe cell elsewhere before giving up.
+        route = self.route_to_frontier(agent_x, agent_y, agent_dir)
+        if route is not None and len(route) > 1:
+            self.commit_route(route)
+            required_dir = route[1][2]
             if agent_dir != required_dir:
                 return self._get_turn_action(agent_dir, required_dir)
             else:
                 return "FORWARD"
         
-        # Check for safe unknown cells (not adjacent to any danger signals)
-        safe_unknown = []
-        for next_dir in DIRECTIONS:
-            dx, dy = DX[next_dir], DY[next_dir]
-            nx, ny = agent_x + dx, agent_y + dy
-            
-            if 0 <= nx < self.N and 0 <= ny < self.N:
-                if ((nx, ny) not in self.kb.visited and
-                    not self.kb.fact_exists("PossiblePit", nx, ny) and
-                    not self.kb.fact_exists("PossibleWumpus", nx, ny) and
-                    not self.kb.fact_exists("Pit", nx, ny) and
-                    not self.kb.fact_exists("Wumpus", nx, ny)):
-                    
-                    is_safe_unknown = True
-                    for adj_x, adj_y in self.kb.get_adjacent(nx, ny):
-                        if (self.kb.fact_exists("Breeze", adj_x, adj_y) or 
-                            self.kb.fact_exists("Stench", adj_x, adj_y)):
-                            is_safe_unknown = False
-                            break
-                    
-                    if is_safe_unknown:
-                        safe_unknown.append((nx, ny, next_dir))
-        
-        if safe_unknown:
-            nx, ny, required_dir = safe_unknown[0]
-            if agent_dir != required_dir:
-                return self._get_turn_action(agent_dir, required_dir)
-            else:
-                return "FORWARD"
+        # Go to where a confirmed wumpus is in the line of fire and shoot it.
+        if not has_shot:
+            action = self.approach_shooting_position(agent_x, agent_y, agent_dir)
+            if action is not None:
+                return action
         
         # No safe adjacent cells available - retreat to (0,0) immediately
-        print(f"No safe adjacent cells available - retreating to (0,0) for safety")
+        if self.log:
+            self.log(f"No safe adjacent cells available - retreating to (0,0) for safety")
         
         if (agent_x, agent_y) != (0, 0):
-            print(f"No safe moves available, returning to start")
-            path = self.a_star_search(agent_x, agent_y, 0, 0, agent_dir, avoid_dangerous=False)
-            if path and len(path) > 1:
-                next_x, next_y, next_dir = path[1]
-                required_dir = self.get_direction_to_move(agent_x, agent_y, next_x, next_y)
-                
+            if self.log:
+                self.log(f"No safe moves available, returning to start")
+            route = self.route_home(agent_x, agent_y, agent_dir, avoid_dangerous=False)
+            if len(route) > 1:
+                self.commit_route(route)
+                required_dir = route[1][2]
                 if agent_dir != required_dir:
                     return self._get_turn_action(agent_dir, required_dir)
                 else:
@@ -305,10 +392,145 @@ class PlanningModule:
         else:
             return "CLIMB"
     
+    def local_move(self, agent_x: int, agent_y: int, agent_dir: str) -> Optional[str]:
+        # Move into a safe or safe-looking neighbour, or None when the
+        # neighbours alone do not decide it.
+        if self.decision_cache is None:
+            return self.decide_local_move(agent_x, agent_y, agent_dir)
+        key = self.decision_cache.key(agent_x, agent_y, agent_dir)
+        action = self.decision_cache.lookup(key)
+        if action is DecisionCache.MISS:
+            action = self.decide_local_move(agent_x, agent_y, agent_dir)
+            self.decision_cache.store(key, action)
+        return action
+    
+    def decide_local_move(self, agent_x: int, agent_y: int, agent_dir: str) -> Optional[str]:
+        safe_adjacent = self.safe_adjacent_moves(agent_x, agent_y)
+        if safe_adjacent:
+            nx, ny, required_dir = safe_adjacent[0]
+            if agent_dir != required_dir:
+                return self._get_turn_action(agent_dir, required_dir)
+            else:
+                return "FORWARD"
+        
+        # Check for safe unknown cells (not adjacent to any danger signals)
+        safe_unknown = self.safe_unknown_moves(agent_x, agent_y)
+        if safe_unknown:
+            nx, ny, required_dir = safe_unknown[0]
+            if agent_dir != required_dir:
+                return self._get_turn_action(agent_dir, required_dir)
+            else:
+                return "FORWARD"
+        return None
+    
+    def route_to_frontier(self, agent_x: int, agent_y: int, agent_dir: str) -> Optional[List[Tuple[int, int, str]]]:
+        return self.frontier.route_to_nearest_safe(agent_x, agent_y, agent_dir)
+    
+    def approach_shooting_position(self, agent_x: int, agent_y: int, agent_dir: str) -> Optional[str]:
+        positions = self.kb.shooting_positions()
+        if not positions:
+            return None
+        wanted = {}
+        for x, y, direction in positions:
+            wanted.setdefault(y * self.N + x, []).append(direction)
+        here = wanted.get(agent_y * self.N + agent_x)
+        if here:
+            return self._get_turn_action(agent_dir, here[0])
+        
+        # Cheapest known-safe state from the sweep, counting the turn to
+        # face the wumpus once there.
+        g_scores, parent, cell_state, order = self.safe_sweep(agent_x, agent_y, agent_dir)
+        best, best_state = float('inf'), -1
+        for cell in order:
+            for shoot_dir in wanted.get(cell, ()):
+                for d, direction in enumerate(DIRECTIONS):
+                    total = g_scores[cell * 4 + d] + self.turn_cost(direction, shoot_dir)
+                    if total < best:
+                        best, best_state = total, cell * 4 + d
+        if best_state == -1:
+            return None
+        
+        route = self.rebuild_path(parent, best_state)
+        self.commit_route(route)
+        required_dir = route[1][2]
+        if agent_dir != required_dir:
+            return self._get_turn_action(agent_dir, required_dir)
+        return "FORWARD"
+    
+    def home_field(self, avoid_dangerous: bool) -> HomeDistanceField:
+        # Built on first use and then repaired incrementally.
+        field = self.home_fields.get(avoid_dangerous)
+        if field is None:
+            field = self.home_fields[avoid_dangerous] = HomeDistanceField(self, avoid_dangerous)
+        return field
+    
+    def route_home(self, agent_x: int, agent_y: int, agent_dir: str,
+                   avoid_dangerous: bool) -> List[Tuple[int, int, str]]:
+        return self.follow_field(self.home_field(avoid_dangerous), agent_x, agent_y, agent_dir)
+    
+    def follow_field(self, field: HomeDistanceField, agent_x: int, agent_y: int,
+                     agent_dir: str) -> List[Tuple[int, int, str]]:
+        # Steps down a distance field's gradient until it reaches a goal.
+        route = [(agent_x, agent_y, agent_dir)]
+        x, y, direction = agent_x, agent_y, agent_dir
+        while True:
+            next_dir = field.next_direction(x, y, direction)
+            if next_dir is None:
+                return route
+            x, y, direction = x + DX[next_dir], y + DY[next_dir], next_dir
+            route.append((x, y, direction))
+    
+    def commit_route(self, route: List[Tuple[int, int, str]]) -> None:
+        # Stop committing where the route passes a cell worth exploring.
+        for i in range(1, len(route)):
+            x, y, _ = route[i]
+            if self.safe_adjacent_moves(x, y) or self.safe_unknown_moves(x, y):
+                route = route[:i + 1]
+                break
+        self.route = route
+    
+    def plan_from_route(self, route: List[Tuple[int, int, str]]) -> Plan:
+        steps = []
+        x, y, direction = route[0]
+        for next_x, next_y, next_dir in route[1:]:
+            while direction != next_dir:
+                action = self._get_turn_action(direction, next_dir)
+                steps.append(((x, y, direction), action))
+                direction = RIGHT_OF[direction] if action == "RIGHT" else LEFT_OF[direction]
+            steps.append(((x, y, direction), "FORWARD"))
+            x, y = next_x, next_y
+        # The route stays valid while nothing that feeds the risk of its
+        # cells, or of the cells next to them, changes.
+        cells = set(self.affected_cells({(x, y) for x, y, _ in route}))
+        return Plan(steps, cells)
+    
+    def make_plan(self, agent_x: int, agent_y: int, agent_dir: str,
+                  has_gold: bool, has_shot: bool, current_score: int = 0) -> Plan:
+        self.route = None
+        action = self.plan_optimal_action(agent_x, agent_y, agent_dir, has_gold, has_shot, current_score)
+        if self.route is not None:
+            plan = self.plan_from_route(self.route)
+            self.route = None
+            return plan
+        return Plan([((agent_x, agent_y, agent_dir), action)], set())
+    
+    def next_action(self, agent_x: int, agent_y: int, agent_dir: str,
+                    has_gold: bool, has_shot: bool, current_score: int = 0) -> str:
+        # Replays the committed plan while it holds, otherwise plans again.
+        if self.plan is not None and not self.should_shoot(agent_x, agent_y, agent_dir, has_shot):
+            action = self.plan.next_action(agent_x, agent_y, agent_dir)
+            if action is not None:
+                return action
+        self.plan = self.make_plan(agent_x, agent_y, agent_dir, has_gold, has_shot, current_score)
+        return self.plan.next_action(agent_x, agent_y, agent_dir)
+    
+    def should_shoot(self, agent_x: int, agent_y: int, agent_dir: str, has_shot: bool) -> bool:
+        if has_shot or self.kb.all_wumpuses_killed():
+            return False
+        return self.kb.wumpus_in_line(agent_x, agent_y, agent_dir)
+    
     def _get_turn_action(self, current_dir: str, required_dir: str) -> str:
-        current_idx = DIRECTIONS.index(current_dir)
-        required_idx = DIRECTIONS.index(required_dir)
-        clockwise_turns = (required_idx - current_idx) % 4
+        clockwise_turns = (DIRECTION_INDEX[required_dir] - DIRECTION_INDEX[current_dir]) % 4
         
         if clockwise_turns <= 2:
             return "RIGHT"
@@ -364,7 +586,8 @@ class PlanningModule:
         
         target_x, target_y, risk, distance = risky_cells[0]
         
-        print(f"Taking calculated risk: targeting ({target_x},{target_y}) with risk {risk:.1f}, {distance} steps away")
+        if self.log:
+            self.log(f"Taking calculated risk: targeting ({target_x},{target_y}) with risk {risk:.1f}, {distance} steps away")
         
         path = self.a_star_search(agent_x, agent_y, target_x, target_y, agent_dir, avoid_dangerous=False)
         
@@ -377,11 +600,8 @@ class PlanningModule:
             else:
                 return "FORWARD"
         
-        for next_dir in DIRECTIONS:
-            dx, dy = DX[next_dir], DY[next_dir]
-            nx, ny = agent_x + dx, agent_y + dy
-            
-            if 0 <= nx < self.N and 0 <= ny < self.N and (nx, ny) not in self.kb.visited:
+        for next_dir, nx, ny in self.topology.moves(agent_x, agent_y):
+            if (nx, ny) not in self.kb.visited:
                 risk = self.calculate_cell_risk(nx, ny)
                 if risk < float('inf'):
                     if agent_dir != next_dir:
@@ -0,0 +1,421 @@
+from math import comb
+
+# Model counts are polynomials stored as lists: entry j is the number of
+# satisfying assignments with exactly j hazards. cap truncates the degree
+# (None keeps every term).
+def poly_mul(a, b, cap=None):
+    size = len(a) + len(b) - 1
+    if cap is not None:
+        size = min(size, cap + 1)
+    result = [0] * size
+    for i, ai in enumerate(a):
+        if ai == 0 or i >= size:
+            continue
+        for j, bj in enumerate(b):
+            if i + j >= size:
+                break
+            result[i + j] += ai * bj
+    return result
+
+def poly_add(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    result = list(a)
+    for i, bi in enumerate(b):
+        result[i] += bi
+    return result
+
+def free_poly(n, cap=None):
+    # n unconstrained cells: (1 + x)^n
+    top = n if cap is None else min(n, cap)
+    return [comb(n, j) for j in range(top + 1)]
+
+def coefficient(poly, j):
+    return poly[j] if 0 <= j < len(poly) else 0
+
+def variables_of(clauses):
+    cells = set()
+    for clause in clauses:
+        cells.update(clause)
+    return cells
+
+def split_components(clauses):
+    # Clauses that share a cell belong to the same component.
+    owner = {}
+    groups = []
+    for clause in clauses:
+        merged = {id(g): g for g in (owner.get(cell) for cell in clause) if g is not None}
+        group = [clause]
+        for other in merged.values():
+            group.extend(other)
+        for c in group:
+            for cell in c:
+                owner[cell] = group
+        for other in merged.values():
+            groups.remove(other)
+        groups.append(group)
+    return [frozenset(group) for group in groups]
+
+class ModelCounter:
+    # Counts the models of "at least one hazard among these cells" clauses
+    # by branching with component caching. Counts are memoised by the
+    # clause set, so a component seen before costs a dictionary lookup.
+    MAX_CACHE = 200000
+
+    def __init__(self):
+        self.cache = {}
+        self.marginal_cache = {}
+
+    def count_models(self, clauses, cap):
+        if not clauses:
+            return [1]
+        key = (clauses, cap)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+
+        components = split_components(clauses)
+        if len(components) > 1:
+            result = [1]
+            for component in components:
+                result = poly_mul(result, self.count_models(component, cap), cap)
+        else:
+            cells = variables_of(clauses)
+            frequency = {}
+            for clause in clauses:
+                for cell in clause:
+                    frequency[cell] = frequency.get(cell, 0) + 1
+            cell = max(sorted(cells), key=lambda c: frequency[c])
+            result = poly_add(self.count_with(clauses, cells, cell, True, cap),
+                              self.count_with(clauses, cells, cell, False, cap))
+
+        if len(self.cache) >= self.MAX_CACHE:
+            self.cache.clear()
+        self.cache[key] = result
+        return result
+
+    def count_with(self, clauses, cells, cell, hazard, cap):
+        # Models of clauses with cell fixed; cells that drop out of every
+        # remaining clause are unconstrained.
+        rest = self.fix(clauses, cell, hazard)
+        if rest is None or (hazard and cap == 0):
+            return [0]
+        lost = len(cells) - 1 - len(variables_of(rest))
+        sub_cap = None if cap is None else cap - hazard
+        models = poly_mul(self.count_models(rest, sub_cap), free_poly(lost, sub_cap), sub_cap)
+        return [0] + models if hazard else models
+
+    def fix(self, clauses, cell, hazard):
+        # The clauses left once cell is decided, or None if one is violated.
+        if hazard:
+            return frozenset(c for c in clauses if cell not in c)
+        rest = frozenset(c - {cell} for c in clauses)
+        return None if frozenset() in rest else rest
+
+    def component_marginals(self, component, cap):
+        # Model count of the component and, for each of its cells, the
+        # model count with a hazard there.
+        key = (component, cap)
+        result = self.marginal_cache.get(key)
+        if result is None:
+            cells = variables_of(component)
+            result = (self.count_models(component, cap),
+                      {cell: self.count_with(component, cells, cell, True, cap) for cell in cells})
+            if len(self.marginal_cache) >= self.MAX_CACHE:
+                self.marginal_cache.clear()
+            self.marginal_cache[key] = result
+        return result
+
+class HazardFrontier:
+    # The undecided cells of one hazard and the components of its percept
+    # clauses, repaired around the cells that changed instead of rebuilt.
+    # A cell's status depends on its own facts and on calm percepts next to
+    # it, and a percept's clause on the status of its neighbours, so a
+    # change reaches clauses at most two steps away.
+    def __init__(self, kb, percept, known, safe):
+        self.kb = kb
+        self.percept = percept
+        self.known = known
+        self.safe = safe
+        self.unknown = set()
+        # Clause per percept cell, how many percept cells produce each
+        # clause, and the percept cells whose clause lost every cell.
+        self.clause_of = {}
+        self.uses = {}
+        self.conflicts = set()
+        self.components = set()
+        self.component_of = {}
+        # None until the first build; afterwards the cells changed since.
+        self.dirty = None
+
+    def mark(self, x, y):
+        if self.dirty is not None:
+            self.dirty.add((x, y))
+
+    def is_unknown(self, cell):
+        return not self.known(cell) and not self.safe(cell)
+
+    def clause_at(self, cell):
+        if not self.kb.fact_exists(self.percept, *cell):
+            return None
+        neighbors = self.kb.get_adjacent(*cell)
+        if any(self.known(n) for n in neighbors):
+            return None
+        return frozenset(n for n in neighbors if n in self.unknown)
+
+    def refresh(self):
+        # True when the unknown cells or the clauses changed.
+        if self.dirty is None:
+            self.build()
+            return True
+        if not self.dirty:
+            return False
+        near = set(self.dirty)
+        for cell in self.dirty:
+            near.update(self.kb.get_adjacent(*cell))
+        self.dirty = set()
+        changed = False
+        for cell in near:
+            if self.is_unknown(cell) != (cell in self.unknown):
+                self.unknown.symmetric_difference_update((cell,))
+                changed = True
+        percepts = set(near)
+        for cell in near:
+            percepts.update(self.kb.get_adjacent(*cell))
+
+        added = set()
+        touched = set()
+        for cell in percepts:
+            old = self.clause_of.get(cell)
+            new = self.clause_at(cell)
+            if new == old:
+                continue
+            changed = True
+            if old is not None:
+                self.release(cell, old)
+                touched.update(old)
+            if new is not None:
+                if self.acquire(cell, new):
+                    added.add(new)
+                touched.update(new)
+        if touched:
+            self.regroup(touched, added)
+        return changed
+
+    def build(self):
+        self.dirty = set()
+        self.unknown = {(x, y) for y in range(self.kb.N) for x in range(self.kb.N)
+                        if self.is_unknown((x, y))}
+        self.clause_of = {}
+        self.uses = {}
+        self.conflicts = set()
+        for cell in self.kb.iter_facts_of(self.percept):
+            clause = self.clause_at(cell)
+            if clause is not None:
+                self.acquire(cell, clause)
+        self.components = set()
+        self.component_of = {}
+        self.regroup((), self.uses)
+
+    def acquire(self, cell, clause):
+        # True when the clause is new.
+        self.clause_of[cell] = clause
+        if not clause:
+            self.conflicts.add(cell)
+            return False
+        self.uses[clause] = self.uses.get(clause, 0) + 1
+        return self.uses[clause] == 1
+
+    def release(self, cell, clause):
+        del self.clause_of[cell]
+        if not clause:
+            self.conflicts.discard(cell)
+            return
+        self.uses[clause] -= 1
+        if not self.uses[clause]:
+            del self.uses[clause]
+
+    def regroup(self, touched, added):
+        # Split again the components the changed clauses touch, with the
+        # clauses they keep and the new ones.
+        dissolved = {self.component_of[cell] for cell in touched if cell in self.component_of}
+        clauses = set(added)
+        for component in dissolved:
+            self.components.discard(component)
+            for clause in component:
+                for cell in clause:
+                    self.component_of.pop(cell, None)
+                if clause in self.uses:
+                    clauses.add(clause)
+        for component in split_components(clauses):
+            self.components.add(component)
+            for cell in variables_of(component):
+                self.component_of[cell] = component
+
+    def component_list(self):
+        # Contradictory percepts leave no components (the prior is used).
+        if self.conflicts:
+            return []
+        return sorted(self.components, key=lambda c: min(variables_of(c)))
+
+class ProbabilityEngine:
+    # Exact hazard probabilities for every cell, given the percepts in the
+    # knowledge base and the generator's model: each cell other than (0,0)
+    # holds a pit with probability p, and the live wumpuses sit on distinct
+    # pit-free cells chosen uniformly.
+    #
+    # A breeze (stench) is a clause "one of these unknown neighbours is a
+    # pit (wumpus)". Clauses that share no cell are independent, so the
+    # frontier is split into components and each one is counted on its own.
+    # A change only regroups the components near it, and the probabilities
+    # of a component are memoised by its clauses.
+    PIT_FACTS = ("Pit", "SafePit", "Breeze", "NoBreeze", "Visited")
+    WUMPUS_FACTS = ("Wumpus", "SafeWumpus", "Pit", "Stench", "NoStench", "Visited")
+
+    def __init__(self, knowledge_base, K, p):
+        self.kb = knowledge_base
+        self.N = knowledge_base.N
+        self.K = K
+        self.p = p
+        self.wumpuses_killed = 0
+        self.counter = ModelCounter()
+        self.pits = HazardFrontier(knowledge_base, "Breeze", self.pit_known, self.pit_safe)
+        self.wumpuses = HazardFrontier(knowledge_base, "Stench", self.wumpus_known, self.wumpus_safe)
+        self.pit_memo = {}
+        # Wumpus components share the live wumpuses, so their probabilities
+        # are combined again whenever any of them changes.
+        self.wumpus = None
+        self.kb.add_listener(self.on_fact_changed)
+
+    def on_fact_changed(self, name, x, y, added):
+        if name in self.PIT_FACTS:
+            self.pits.mark(x, y)
+        if name in self.WUMPUS_FACTS:
+            self.wumpuses.mark(x, y)
+        if name in ("Wumpus", "AllWumpusesKilled"):
+            self.wumpus = None
+
+    def wumpus_killed(self):
+        self.wumpuses_killed += 1
+        self.wumpus = None
+
+    def calm_next_to(self, percept, cell):
+        return any(self.kb.fact_exists(percept, nx, ny) for nx, ny in self.kb.get_adjacent(*cell))
+
+    def pit_known(self, cell):
+        return self.kb.fact_exists("Pit", *cell)
+
+    def pit_safe(self, cell):
+        return (cell == (0, 0) or cell in self.kb.visited or self.kb.fact_exists("SafePit", *cell)
+                or self.calm_next_to("NoBreeze", cell))
+
+    def wumpus_known(self, cell):
+        return self.kb.fact_exists("Wumpus", *cell)
+
+    def wumpus_safe(self, cell):
+        return (cell == (0, 0) or cell in self.kb.visited or self.kb.fact_exists("SafeWumpus", *cell)
+                or self.kb.fact_exists("Pit", *cell) or self.calm_next_to("NoStench", cell))
+
+    def pit_constraints(self):
+        # Known pits, undecided cells and the breeze components over them.
+        self.pits.refresh()
+        return set(self.kb.iter_facts_of("Pit")), set(self.pits.unknown), self.pits.component_list()
+
+    def wumpus_constraints(self):
+        # Known wumpuses, undecided cells, the stench components over them
+        # and how many more wumpuses are alive.
+        if self.kb.all_wumpuses_killed():
+            return set(), set(), [], 0
+        self.wumpuses.refresh()
+        known = set(self.kb.iter_facts_of("Wumpus"))
+        alive = max(self.K - self.wumpuses_killed - len(known), 0)
+        return known, set(self.wumpuses.unknown), self.wumpuses.component_list(), alive
+
+    def component_pits(self, component):
+        probabilities = self.pit_memo.get(component)
+        if probabilities is not None:
+            return probabilities
+        p = self.p
+        total, with_hazard = self.counter.component_marginals(component, None)
+        n = len(with_hazard)
+        weight = sum(c * p ** j * (1 - p) ** (n - j) for j, c in enumerate(total))
+        if weight == 0:
+            probabilities = {cell: p for cell in with_hazard}
+        else:
+            probabilities = {cell: sum(c * p ** j * (1 - p) ** (n - j) for j, c in enumerate(models)) / weight
+                             for cell, models in with_hazard.items()}
+        if len(self.pit_memo) >= ModelCounter.MAX_CACHE:
+            self.pit_memo.clear()
+        self.pit_memo[component] = probabilities
+        return probabilities
+
+    def pit_probability(self, x, y):
+        self.pits.refresh()
+        cell = (x, y)
+        if self.kb.fact_exists("Pit", x, y):
+            return 1.0
+        if cell not in self.pits.unknown:
+            return 0.0
+        component = self.pits.component_of.get(cell)
+        if component is None or self.pits.conflicts:
+            return self.p
+        return self.component_pits(component)[cell]
+
+    def combine_wumpuses(self):
+        # The model count of every way to place the live wumpuses and, per
+        # component, the count over everything else.
+        known = len(list(self.kb.iter_facts_of("Wumpus")))
+        alive = max(self.K - self.wumpuses_killed - known, 0)
+        components = self.wumpuses.component_list()
+        marginals = [self.counter.component_marginals(component, alive) for component in components]
+        free = len(self.wumpuses.unknown) - sum(len(with_hazard) for _, with_hazard in marginals)
+        # prefix[i]: the free cells and components before i; suffix[i]: the
+        # components from i on.
+        prefix = [free_poly(free, alive)]
+        for total, _ in marginals:
+            prefix.append(poly_mul(prefix[-1], total, alive))
+        suffix = [[1]]
+        for total, _ in reversed(marginals):
+            suffix.insert(0, poly_mul(total, suffix[0], alive))
+        state = {"alive": alive, "weight": coefficient(prefix[-1], alive), "share": 0.0,
+                 "components": {}, "cells": {}}
+        if alive == 0 or state["weight"] == 0:
+            return state
+        if free:
+            others = free_poly(free - 1, alive)
+            for total, _ in marginals:
+                others = poly_mul(others, total, alive)
+            state["share"] = coefficient(others, alive - 1) / state["weight"]
+        for i, component in enumerate(components):
+            state["components"][component] = (poly_mul(prefix[i], suffix[i + 1], alive), marginals[i][1])
+        return state
+
+    def wumpus_probability(self, x, y):
+        if self.kb.all_wumpuses_killed():
+            return 0.0
+        if self.kb.fact_exists("Wumpus", x, y):
+            return 1.0
+        if self.wumpuses.refresh() or self.wumpus is None:
+            self.wumpus = self.combine_wumpuses()
+        state = self.wumpus
+        cell = (x, y)
+        alive = state["alive"]
+        if alive == 0 or cell not in self.wumpuses.unknown:
+            return 0.0
+        if state["weight"] == 0:
+            # The percepts contradict the model (e.g. a wumpus has moved);
+            # spread the live wumpuses evenly over the unknown cells.
+            return min(alive / len(self.wumpuses.unknown), 1.0)
+        component = self.wumpuses.component_of.get(cell)
+        if component is None or self.wumpuses.conflicts:
+            return state["share"]
+        probability = state["cells"].get(cell)
+        if probability is None:
+            others, with_hazard = state["components"][component]
+            probability = coefficient(poly_mul(others, with_hazard[cell], alive), alive) / state["weight"]
+            state["cells"][cell] = probability
+        return probability
+
+    def death_probability(self, x, y):
+        # Pits and wumpuses never share a cell.
+        return min(self.pit_probability(x, y) + self.wumpus_probability(x, y), 1.0)
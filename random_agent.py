@@ -1,6 +1,10 @@
 import random
+from const import DIRECTIONS, GLITTER, SCREAM, pack_percepts
+from topology import DIRECTION_INDEX
 
 class RandomAgent:
+    # Messages go through log, as for Agent.
+    log = print
     
     def __init__(self, N, K=2):
         self.N = N
@@ -18,6 +22,7 @@ class RandomAgent:
         self.visited.add((0, 0))
         
         self.actions = ["FORWARD", "LEFT", "RIGHT", "SHOOT", "GRAB", "CLIMB"]
+        self.last_percepts = 0
         
     def update_position(self, x, y, direction):
         self.current_x = x
@@ -27,24 +32,28 @@ class RandomAgent:
     
     def Agent_get_percepts(self, percept):
         x, y = percept["position"]
-        direction = percept["direction"]
-        
-        self.update_position(x, y, direction)
-        self.last_percepts = percept
+        self.perceive(x, y, DIRECTION_INDEX[percept["direction"]], pack_percepts(percept))
+
+    def perceive(self, x, y, direction, bits):
+        self.update_position(x, y, DIRECTIONS[direction])
+        self.last_percepts = bits
         
-        if percept.get("scream"):
+        if bits & SCREAM:
             self.wumpuses_killed += 1
-            print(f"Random Agent: Wumpus killed! Total wumpuses killed: {self.wumpuses_killed}/{self.K}")
+            if self.log:
+                self.log(f"Random Agent: Wumpus killed! Total wumpuses killed: {self.wumpuses_killed}/{self.K}")
     
     def grab_gold_action(self):
         x, y = self.current_x, self.current_y
-        if hasattr(self, 'last_percepts') and self.last_percepts.get("glitter"):
-            print("Random agent randomly grabbed gold!")
+        if self.last_percepts & GLITTER:
+            if self.log:
+                self.log("Random agent randomly grabbed gold!")
             self.has_gold = True
             self.score += 10  
             return True
         else:
-            print("Random agent tried to grab gold but nothing here")
+            if self.log:
+                self.log("Random agent tried to grab gold but nothing here")
             return False
     
     def climb_action(self):
@@ -86,7 +95,8 @@ class RandomAgent:
         
         available_actions.extend(["GRAB", "CLIMB"])
         action = random.choice(available_actions)
-        print(f"Random agent chooses: {action}")
+        if self.log:
+            self.log(f"Random agent chooses: {action}")
         
         return action
     
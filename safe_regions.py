@@ -0,0 +1,67 @@
+class SafeRegions:
+    # Union-find over the cells known to be safe (Safe facts and visited
+    # cells), joined through their 4-neighbours. Adding a safe cell merges
+    # regions in place; a retracted Safe fact can split a region, so the
+    # whole structure is rebuilt from the knowledge base on the next query.
+    def __init__(self, kb):
+        self.kb = kb
+        self.N = kb.N
+        self.parent = list(range(self.N * self.N))
+        self.rank = bytearray(self.N * self.N)
+        self.member = bytearray(self.N * self.N)
+        self.stale = False
+        kb.add_listener(self.on_fact_changed)
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri == rj:
+            return
+        if self.rank[ri] < self.rank[rj]:
+            ri, rj = rj, ri
+        self.parent[rj] = ri
+        if self.rank[ri] == self.rank[rj]:
+            self.rank[ri] += 1
+
+    def add(self, x, y):
+        i = y * self.N + x
+        if self.member[i]:
+            return
+        self.member[i] = 1
+        for nx, ny in self.kb.get_adjacent(x, y):
+            j = ny * self.N + nx
+            if self.member[j]:
+                self.union(i, j)
+
+    def on_fact_changed(self, name, x, y, added):
+        if name not in ("Safe", "Visited") or not (0 <= x < self.N and 0 <= y < self.N):
+            return
+        if added:
+            if not self.stale:
+                self.add(x, y)
+        else:
+            self.stale = True
+
+    def rebuild(self):
+        size = self.N * self.N
+        self.parent = list(range(size))
+        self.rank = bytearray(size)
+        self.member = bytearray(size)
+        self.stale = False
+        for x, y in self.kb.iter_facts_of("Safe"):
+            self.add(x, y)
+        for x, y in list(self.kb.visited):
+            self.add(x, y)
+
+    def connected(self, x1, y1, x2, y2):
+        # True when a path of known-safe cells joins the two cells.
+        if self.stale:
+            self.rebuild()
+        i, j = y1 * self.N + x1, y2 * self.N + x2
+        return self.member[i] == 1 and self.member[j] == 1 and self.find(i) == self.find(j)
@@ -0,0 +1,265 @@
+import time
+from const import ACTION_CODE
+
+class Observer:
+    # Base for the hooks a Simulator calls. Subclasses override the ones
+    # they need; with no observer attached none of them is called.
+    def on_step(self, sim):
+        pass
+
+    def on_perceived(self, sim):
+        pass
+
+    def on_action(self, sim, action):
+        pass
+
+    def on_message(self, sim, text):
+        pass
+
+    def on_step_end(self, sim):
+        pass
+
+    def on_end(self, sim, result):
+        pass
+
+class SimulationResult:
+    def __init__(self, score, steps, has_gold, climbed, died):
+        self.score = score
+        self.steps = steps
+        self.has_gold = has_gold
+        self.climbed = climbed
+        self.died = died
+        self.success = has_gold and climbed
+
+class Simulator:
+    # Runs one episode of an agent in an environment at full speed. Agents
+    # take percepts through perceive(x, y, direction, bits) and pick actions
+    # with choose_action(); each action name is mapped to its code and
+    # applied by the matching step_* method, which returns True when the
+    # episode is over. The environment's, agent's and planner's messages
+    # are routed through say, so a run without observers prints nothing.
+    def __init__(self, env, agent, max_steps=300, observers=()):
+        self.env = env
+        self.agent = agent
+        self.max_steps = max_steps
+        self.observers = list(observers)
+        self.step_count = 0
+        self.died = False
+        self.handlers = (self.step_forward, self.step_left, self.step_right,
+                         self.step_grab, self.step_shoot, self.step_climb)
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def say(self, text):
+        for observer in self.observers:
+            observer.on_message(self, text)
+
+    def perceive(self):
+        env = self.env
+        self.agent.perceive(env.agent_x, env.agent_y, env.dir, env.percept_bits())
+
+    def after_action(self):
+        pass
+
+    def connect(self):
+        log = self.say if self.observers else None
+        self.env.log = log
+        self.agent.log = log
+        planner = getattr(self.agent, 'planning_module', None)
+        if planner is not None:
+            planner.log = log
+
+    def run(self):
+        self.connect()
+        observers = self.observers
+        while self.step_count < self.max_steps:
+            self.step_count += 1
+            if observers:
+                for observer in observers:
+                    observer.on_step(self)
+            self.perceive()
+            if observers:
+                for observer in observers:
+                    observer.on_perceived(self)
+
+            action = self.agent.choose_action()
+            if observers:
+                for observer in observers:
+                    observer.on_action(self, action)
+            code = ACTION_CODE.get(action)
+            if code is not None and self.handlers[code]():
+                break
+            self.after_action()
+            if observers:
+                for observer in observers:
+                    observer.on_step_end(self)
+
+        result = self.result()
+        for observer in observers:
+            observer.on_end(self, result)
+        return result
+
+    def result(self):
+        env, agent = self.env, self.agent
+        return SimulationResult(agent.currentScore(), self.step_count, agent.has_gold,
+                                env.agent_x == 0 and env.agent_y == 0, self.died)
+
+    def die(self, text):
+        self.agent.die_action()
+        self.died = True
+        self.say(text)
+        return True
+
+    def step_forward(self):
+        died, bump = self.env.move_forward()
+        self.agent.move_forward_action()
+        if died:
+            return self.die("GAME OVER! Agent died!")
+        if bump:
+            self.say("BUMP! Hit a wall!")
+        return False
+
+    def step_left(self):
+        self.env.turn_left()
+        self.agent.turn_action()
+        return False
+
+    def step_right(self):
+        self.env.turn_right()
+        self.agent.turn_action()
+        return False
+
+    def step_grab(self):
+        if self.agent.grab_gold_action():
+            self.env.grab_gold()
+        return False
+
+    def step_shoot(self):
+        if self.agent.shoot_action():
+            self.env.shoot()
+            self.report_shot()
+        return False
+
+    def report_shot(self):
+        if self.env.scream:
+            self.say("SCREAM! Wumpus killed!")
+        else:
+            self.say("Arrow shot, but no scream...")
+
+    def step_climb(self):
+        if self.agent.climb_action():
+            if self.env.climb():
+                self.report_climb()
+                return True
+        elif self.env.agent_x != 0 or self.env.agent_y != 0:
+            self.say("Can only climb at starting position (0,0)!")
+        return False
+
+    def report_climb(self):
+        self.say(f"FINAL SCORE: {self.agent.currentScore()}")
+
+class MovingWumpusSimulator(Simulator):
+    # Simulator for MovingWumpusEnvironment: the environment's actions
+    # report whether a wumpus walked into the agent, and an AdaptiveAgent
+    # is told about each movement phase.
+    EATEN = "GAME OVER! Agent was eaten by a moving Wumpus!"
+
+    def perceive(self):
+        super().perceive()
+        if hasattr(self.agent, 'handle_wumpus_movement_phase'):
+            self.agent.handle_wumpus_movement_phase(self.env.action_count)
+
+    def after_action(self):
+        if self.env.action_count % 5 == 0 and hasattr(self.agent, 'inference_engine'):
+            self.say("Re-running inference after Wumpus movement...")
+            self.agent.inference_engine.logic_inference_forward_chaining()
+
+    def step_forward(self):
+        died, bump = self.env.move_forward()
+        self.agent.move_forward_action()
+        if died:
+            if self.env.check_wumpus_collision():
+                return self.die(self.EATEN)
+            return self.die("GAME OVER! Agent died!")
+        if bump:
+            self.say("BUMP! Hit a wall!")
+        return False
+
+    def step_left(self):
+        died = self.env.turn_left()
+        self.agent.turn_action()
+        if died:
+            return self.die(self.EATEN)
+        self.say("Turned left")
+        return False
+
+    def step_right(self):
+        died = self.env.turn_right()
+        self.agent.turn_action()
+        if died:
+            return self.die(self.EATEN)
+        self.say("Turned right")
+        return False
+
+    def step_grab(self):
+        if self.agent.grab_gold_action():
+            self.env.grab_gold()
+            if self.env.check_wumpus_collision():
+                return self.die("GAME OVER! Agent was eaten by a moving Wumpus during grab!")
+        return False
+
+    def step_shoot(self):
+        if self.agent.shoot_action():
+            if self.env.shoot():
+                return self.die(self.EATEN)
+            self.report_shot()
+            if self.env.scream and hasattr(self.agent, 'inference_engine'):
+                self.agent.inference_engine.handle_shoot(self.env.agent_x, self.env.agent_y, self.env.agent_dir)
+        return False
+
+    def report_climb(self):
+        self.say("MISSION COMPLETE! Agent successfully escaped with the gold!")
+        super().report_climb()
+
+class ConsoleObserver(Observer):
+    # Prints the real and believed maps and the messages of every step,
+    # pausing delay seconds after each one.
+    def __init__(self, agent_type="Intelligent", delay=0.0):
+        self.agent_type = agent_type
+        self.delay = delay
+
+    def on_step(self, sim):
+        print(f"\n-Step {sim.step_count}")
+        print("Real Environment:")
+        sim.env.print_map()
+
+    def on_perceived(self, sim):
+        env, agent = sim.env, sim.agent
+        print(f"\n{self.agent_type} Agent's Knowledge:")
+        agent.print_agent_map(env.N, env.N, env.agent_x, env.agent_y)
+        print(f"\nCurrent Score: {agent.currentScore()} | Gold: {'Yes' if agent.has_gold else 'No'}")
+
+    def on_action(self, sim, action):
+        print(f"\n{self.agent_type} Agent chooses action: {action}")
+
+    def on_message(self, sim, text):
+        print(text)
+
+    def on_step_end(self, sim):
+        if self.delay:
+            time.sleep(self.delay)
+
+class MovingWumpusConsole(ConsoleObserver):
+    def __init__(self, delay=0.0):
+        super().__init__("Adaptive", delay)
+
+    def on_step(self, sim):
+        print(f"\n--- Step {sim.step_count} ---")
+        print("Real Environment:")
+        sim.env.print_map()
+
+    def on_perceived(self, sim):
+        env = sim.env
+        print(f"\nAdaptive Agent's Knowledge:")
+        sim.agent.print_agent_map(env.N, env.N, env.agent_x, env.agent_y)
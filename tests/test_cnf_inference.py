@@ -0,0 +1,33 @@
+from cnf_inference_engine import CNFInferenceEngine
+from knowledge_base import KnowledgeBase
+
+def two_stenches():
+    # Stenches at (0,0) and (2,0) with one wumpus: only (1,0) explains both,
+    # which takes a search, not unit propagation.
+    kb = KnowledgeBase(4)
+    engine = CNFInferenceEngine(kb, wumpus_count=1)
+    for x in (0, 2):
+        kb.visited.add((x, 0))
+        kb.add_fact("Stench", x, 0)
+        engine.rule_stench_possible_wumpus(x, 0)
+    engine.logic_inference_forward_chaining()
+    return kb, engine
+
+def test_searched_fact_rests_on_the_percepts_it_used():
+    kb, engine = two_stenches()
+    assert kb.fact_exists("Wumpus", 1, 0)
+    engine.retract("Stench", 2, 0)
+    assert not kb.fact_exists("Wumpus", 1, 0)
+
+def test_kill_retracts_stench_clauses_in_place():
+    kb, engine = two_stenches()
+    solver = engine.solver
+    wumpus = engine.wumpus_var(1, 0)
+    assert solver.value[wumpus] is True
+    engine.wumpus_killed()
+    engine.forget_stench()
+    assert engine.solver is solver
+    assert not engine.stench_clauses and not engine.learned
+    # No wumpus is left, so every wumpus variable is false again.
+    assert solver.value[wumpus] is False
+    assert all(solver.value[v] is False for v in solver.limit_vars[0])
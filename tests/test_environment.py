@@ -0,0 +1,31 @@
+import random
+import sys
+import tracemalloc
+from environment import Environment, PIT, WUMPUS
+
+def test_world_of_a_million_cells_is_three_planes():
+    # One byte of flags and two neighbour counts per cell, nothing per cell
+    # beyond that: about 3 MB for 1000 x 1000.
+    random.seed(0)
+    env = Environment(1000)
+    size = sum(sys.getsizeof(value) for value in vars(env).values())
+    assert size < 3.1 * 1000 * 1000
+
+def test_generation_allocates_nothing_per_cell_beyond_the_planes():
+    random.seed(0)
+    tracemalloc.start()
+    try:
+        Environment(200)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 3 * 200 * 200 + 64 * 1024
+
+def test_percept_counts_follow_pits_and_wumpuses():
+    random.seed(3)
+    env = Environment(12, 2, 0.2)
+    for y in range(12):
+        for x in range(12):
+            adjacent = env.get_adjacent(x, y)
+            assert env.breeze[y * 12 + x] == sum(env.has(nx, ny, PIT) for nx, ny in adjacent)
+            assert env.stench[y * 12 + x] == sum(env.has(nx, ny, WUMPUS) for nx, ny in adjacent)
@@ -0,0 +1,23 @@
+import time
+
+from expectimax_planner import ExpectimaxPlanner
+from knowledge_base import KnowledgeBase
+from probability_engine import ProbabilityEngine
+
+def start_planner(**kwargs):
+    kb = KnowledgeBase(8)
+    kb.mark_visited(0, 0)
+    for name in ("Safe", "SafePit", "SafeWumpus", "NoBreeze", "NoStench"):
+        kb.add_fact(name, 0, 0)
+    return ExpectimaxPlanner(kb, 8, ProbabilityEngine(kb, 1, 0.2), **kwargs)
+
+def test_deadline_bounds_an_unbounded_search():
+    planner = start_planner(node_budget=None, max_depth=40, time_budget=0.05)
+    start = time.perf_counter()
+    assert planner.search(0, 0, "E", False) == "FORWARD"
+    assert time.perf_counter() - start < 1.0
+    assert planner.deadline is None
+
+def test_expired_deadline_still_completes_depth_one():
+    expected = start_planner(max_depth=1).search(0, 0, "E", False)
+    assert start_planner(time_budget=0.0).search(0, 0, "E", False) == expected
@@ -0,0 +1,56 @@
+import random
+from adaptive_agent import AdaptiveAgent
+from agent import Agent
+from environment import Environment
+from moving_wumpus_environment import MovingWumpusEnvironment
+from simulator import Simulator, MovingWumpusSimulator
+
+PREDICATES = ("Safe", "SafePit", "SafeWumpus", "Pit", "Wumpus", "PossiblePit", "PossibleWumpus")
+
+def play_with_shadow(seed, N):
+    # Plays an eager agent and feeds every percept it gets to a lazy one
+    # too, collecting the cells where their beliefs disagree.
+    random.seed(seed)
+    env = Environment(N, 2, 0.15)
+    eager = Agent(N, 2)
+    lazy = Agent(N, 2, lazy_inference=True)
+    lazy.log = None
+    perceive = eager.perceive
+    differences = []
+
+    def perceive_both(x, y, direction, bits):
+        perceive(x, y, direction, bits)
+        lazy.perceive(x, y, direction, bits)
+        for cx in range(N):
+            for cy in range(N):
+                for name in PREDICATES:
+                    if eager.kb.fact_exists(name, cx, cy) != lazy.beliefs.fact_exists(name, cx, cy):
+                        differences.append((name, cx, cy))
+                if (eager.kb.same_safe_region((x, y), (cx, cy)) !=
+                        lazy.beliefs.same_safe_region((x, y), (cx, cy))):
+                    differences.append(("region", cx, cy))
+        if sorted(eager.kb.shooting_positions()) != sorted(lazy.beliefs.shooting_positions()):
+            differences.append(("shooting positions", x, y))
+
+    eager.perceive = perceive_both
+    Simulator(env, eager).run()
+    return differences
+
+def test_lazy_queries_match_the_eager_fixpoint():
+    for seed in range(60):
+        assert play_with_shadow(seed, (4, 6, 8, 10)[seed % 4]) == [], seed
+
+def moving_wumpus_actions(seed, **kwargs):
+    random.seed(seed)
+    env = MovingWumpusEnvironment(8, 2, 0.1)
+    env.log = None
+    agent = AdaptiveAgent(8, 2, **kwargs)
+    actions = []
+    choose_action = agent.choose_action
+    agent.choose_action = lambda: actions.append(choose_action()) or actions[-1]
+    MovingWumpusSimulator(env, agent).run()
+    return actions
+
+def test_lazy_adaptive_agent_plays_like_the_eager_one():
+    for seed in range(20):
+        assert moving_wumpus_actions(seed) == moving_wumpus_actions(seed, lazy_inference=True), seed
@@ -0,0 +1,29 @@
+import random
+from environment import Environment, PIT, WUMPUS
+from knowledge_base import KnowledgeBase
+from probability_engine import ProbabilityEngine
+
+def test_repaired_components_match_a_fresh_build():
+    random.seed(5)
+    N = 10
+    env = Environment(N, 2, 0.15)
+    kb = KnowledgeBase(N)
+    engine = ProbabilityEngine(kb, 2, 0.15)
+    cells = [(x, y) for y in range(N) for x in range(N) if not env.has(x, y, PIT) and not env.has(x, y, WUMPUS)]
+    random.shuffle(cells)
+    for step, (x, y) in enumerate(cells[:40]):
+        kb.mark_visited(x, y)
+        adjacent = kb.get_adjacent(x, y)
+        kb.add_fact("Breeze" if any(env.has(a, b, PIT) for a, b in adjacent) else "NoBreeze", x, y)
+        kb.add_fact("Stench" if any(env.has(a, b, WUMPUS) for a, b in adjacent) else "NoStench", x, y)
+        if step % 7 == 6:
+            # Retractions shrink clauses back.
+            for name in ("Stench", "Breeze"):
+                for cell in list(kb.iter_facts_of(name))[:1]:
+                    kb.remove_fact(name, *cell)
+        engine.death_probability(x, y)
+        fresh = ProbabilityEngine(kb, 2, 0.15)
+        for cy in range(N):
+            for cx in range(N):
+                assert engine.pit_probability(cx, cy) == fresh.pit_probability(cx, cy)
+                assert engine.wumpus_probability(cx, cy) == fresh.wumpus_probability(cx, cy)
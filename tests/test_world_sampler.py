@@ -0,0 +1,15 @@
+import random
+from world_sampler import WorldModel
+
+def test_wumpus_never_shares_a_cell_with_a_pit():
+    # One breeze and one stench over the same two cells: the pits often fill
+    # both, and the wumpus then has nowhere to go.
+    cells = {(1, 0), (0, 1)}
+    clause = frozenset([frozenset(cells)])
+    model = WorldModel(0.6, (set(), set(cells), [clause]), (set(), set(cells), [clause], 1), [(1, 1)])
+    rng = random.Random(0)
+    for _ in range(500):
+        world = model.sample(rng)
+        assert not world.pits & world.wumpuses
+        assert len(world.wumpuses) == 1 and world.wumpuses <= cells
+        assert world.pits & cells
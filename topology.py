@@ -0,0 +1,60 @@
+from itertools import repeat
+from const import DIRECTIONS, DX, DY
+
+# Direction tables, so code does not search DIRECTIONS.
+DIRECTION_INDEX = {d: i for i, d in enumerate(DIRECTIONS)}
+LEFT_OF = {d: DIRECTIONS[(i - 1) % 4] for i, d in enumerate(DIRECTIONS)}
+RIGHT_OF = {d: DIRECTIONS[(i + 1) % 4] for i, d in enumerate(DIRECTIONS)}
+OPPOSITE = {d: DIRECTIONS[(i + 2) % 4] for i, d in enumerate(DIRECTIONS)}
+# Quarter turns between two facings.
+TURNS = {a: {b: min((j - i) % 4, (i - j) % 4) for j, b in enumerate(DIRECTIONS)}
+         for i, a in enumerate(DIRECTIONS)}
+
+class Topology:
+    # Neighbour and ray lookups for an N x N grid. Each cell's moves are
+    # built the first time they are asked for and then shared, as immutable
+    # tuples, by everything that uses the same N; rays are computed from
+    # the coordinates, so nothing is built per row or column.
+    def __init__(self, N):
+        self.N = N
+        self.move_table = [None] * (N * N)
+        self.neighbor_table = [None] * (N * N)
+
+    def moves(self, x, y):
+        # (direction, nx, ny) for every in-grid step, in DIRECTIONS order.
+        i = y * self.N + x
+        moves = self.move_table[i]
+        if moves is None:
+            moves = tuple((d, x + DX[d], y + DY[d]) for d in DIRECTIONS
+                          if 0 <= x + DX[d] < self.N and 0 <= y + DY[d] < self.N)
+            self.move_table[i] = moves
+        return moves
+
+    def neighbors(self, x, y):
+        if not (0 <= x < self.N and 0 <= y < self.N):
+            return tuple((x + DX[d], y + DY[d]) for d in DIRECTIONS
+                         if 0 <= x + DX[d] < self.N and 0 <= y + DY[d] < self.N)
+        i = y * self.N + x
+        cells = self.neighbor_table[i]
+        if cells is None:
+            cells = self.neighbor_table[i] = tuple((nx, ny) for _, nx, ny in self.moves(x, y))
+        return cells
+
+    def ray(self, x, y, direction):
+        # Cells an arrow shot from (x, y) passes, nearest first, generated
+        # as the caller walks them.
+        if direction == 'E':
+            return zip(range(x + 1, self.N), repeat(y))
+        if direction == 'W':
+            return zip(range(x - 1, -1, -1), repeat(y))
+        if direction == 'N':
+            return zip(repeat(x), range(y + 1, self.N))
+        return zip(repeat(x), range(y - 1, -1, -1))
+
+_topologies = {}
+
+def get_topology(N):
+    topology = _topologies.get(N)
+    if topology is None:
+        topology = _topologies[N] = Topology(N)
+    return topology
@@ -0,0 +1,47 @@
+class TruthMaintenance:
+    # Justification-based truth maintenance. Each derived fact keeps the
+    # antecedent facts of every derivation recorded for it; when a fact is
+    # removed from the knowledge base, any conclusion left without a
+    # justification is withdrawn as well. Facts with no recorded derivation,
+    # or with an empty justification, are premises and are never withdrawn.
+    def __init__(self, knowledge_base):
+        self.kb = knowledge_base
+        self.justifications = {}
+        self.dependents = {}
+        self.withdrawn = None
+        self.kb.add_listener(self.on_fact_changed)
+
+    def justify(self, fact, antecedents):
+        self.justifications.setdefault(fact, []).append(antecedents)
+        for antecedent in antecedents:
+            self.dependents.setdefault(antecedent, set()).add(fact)
+
+    def assume(self, fact):
+        # Only matters for a fact that was derived before it was observed.
+        if fact in self.justifications:
+            self.justifications[fact].append(())
+
+    def retract(self, name, x, y):
+        self.withdrawn = []
+        try:
+            self.kb.remove_fact(name, x, y)
+            return self.withdrawn
+        finally:
+            self.withdrawn = None
+
+    def on_fact_changed(self, name, x, y, added):
+        if added:
+            return
+        fact = (name, x, y)
+        if self.withdrawn is not None:
+            self.withdrawn.append(fact)
+        self.justifications.pop(fact, None)
+
+        for dependent in self.dependents.pop(fact, ()):
+            justifications = self.justifications.get(dependent)
+            if justifications is None:
+                continue
+            justifications[:] = [j for j in justifications if fact not in j]
+            if not justifications:
+                del self.justifications[dependent]
+                self.kb.remove_fact(*dependent)
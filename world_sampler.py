@@ -0,0 +1,237 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+from const import DX, DY
+from probability_engine import ModelCounter, coefficient, free_poly, poly_mul, variables_of
+
+class World:
+    def __init__(self, pits, wumpuses, gold):
+        self.pits = pits
+        self.wumpuses = wumpuses
+        self.gold = gold
+
+    def is_deadly(self, x, y):
+        return (x, y) in self.pits or (x, y) in self.wumpuses
+
+class WorldModel:
+    # Snapshot of the constraints from a ProbabilityEngine. It holds no
+    # reference to the knowledge base, so it can be sent to worker processes.
+    MAX_PIT_TRIES = 20
+
+    def __init__(self, p, pit_constraints, wumpus_constraints, gold_cells):
+        self.p = p
+        self.counter = ModelCounter()
+
+        known, unknown, components = pit_constraints
+        self.known_pits = frozenset(known)
+        self.pit_components = components
+        constrained = set()
+        for component in components:
+            constrained.update(variables_of(component))
+        self.free_pit_cells = sorted(unknown - constrained)
+
+        known, unknown, components, alive = wumpus_constraints
+        self.known_wumpuses = frozenset(known)
+        self.wumpus_components = components
+        self.alive = alive
+        self.wumpus_cells = sorted(unknown)
+        constrained = set()
+        for component in components:
+            constrained.update(variables_of(component))
+        self.frontier_wumpus_cells = frozenset(constrained)
+        self.free_wumpus_cells = sorted(unknown - constrained)
+        # Wumpus layouts by the frontier cells a pit rules out and the number
+        # of free cells left.
+        self.layouts = {}
+        # False when the stenches cannot be explained even without pits
+        # (e.g. a wumpus has moved), or there is no wumpus to place.
+        self.wumpuses_placeable = (alive > 0 and bool(self.wumpus_cells)
+                                   and self.layout_without(frozenset()) is not None)
+
+        self.gold_cells = gold_cells
+
+    def layout_without(self, pits):
+        # The wumpus components, free cells and model counts once the pits
+        # are ruled out, or None if the live wumpuses no longer fit.
+        blocked = self.frontier_wumpus_cells & pits
+        free = [cell for cell in self.free_wumpus_cells if cell not in pits]
+        key = (blocked, len(free))
+        if key not in self.layouts:
+            self.layouts[key] = self.rule_out(blocked, len(free))
+        layout = self.layouts[key]
+        if layout is None:
+            return None
+        components, freed, totals, suffix = layout
+        return components, free + freed, totals, suffix
+
+    def rule_out(self, blocked, free_count):
+        components = []
+        freed = []
+        for component in self.wumpus_components:
+            cells = variables_of(component)
+            for cell in sorted(cells & blocked):
+                component = self.counter.fix(component, cell, False)
+                if component is None:
+                    return None
+            # Cells that no clause mentions any more are free.
+            freed.extend(sorted(cells - variables_of(component) - blocked))
+            if component:
+                components.append(component)
+
+        # suffix[i]: models of components i.. plus the free cells, by count.
+        totals = [self.counter.count_models(c, self.alive) for c in components]
+        suffix = [free_poly(free_count + len(freed), self.alive)]
+        for total in reversed(totals):
+            suffix.insert(0, poly_mul(total, suffix[0], self.alive))
+        if coefficient(suffix[0], self.alive) == 0:
+            return None
+        return components, freed, totals, suffix
+
+    def pit_weight(self, poly, n):
+        return sum(c * self.p ** j * (1 - self.p) ** (n - j) for j, c in enumerate(poly))
+
+    def sample_component(self, clauses, rng, weight):
+        # Decide the cells one at a time, each with its exact conditional
+        # probability given the model counts. The weights see the hazards of
+        # the whole component, including those already placed. Returns the
+        # hazards placed and the cells the clauses no longer constrain.
+        placed = []
+        free = []
+        cells = variables_of(clauses)
+        while clauses:
+            cell = min(cells)
+            spare = [0] * len(placed) + free_poly(len(free))
+            n = len(cells) + len(free) + len(placed)
+            w_true = weight(poly_mul(self.counter.count_with(clauses, cells, cell, True, None), spare), n)
+            w_false = weight(poly_mul(self.counter.count_with(clauses, cells, cell, False, None), spare), n)
+            hazard = rng.random() * (w_true + w_false) < w_true
+            if hazard:
+                placed.append(cell)
+            clauses = self.counter.fix(clauses, cell, hazard)
+            remaining = variables_of(clauses)
+            free.extend(sorted(cells - remaining - {cell}))
+            cells = remaining
+        return placed, free
+
+    def sample_pits(self, rng):
+        pits = set(self.known_pits)
+        for component in self.pit_components:
+            placed, free = self.sample_component(component, rng, self.pit_weight)
+            pits.update(placed)
+            pits.update(cell for cell in free if rng.random() < self.p)
+        pits.update(cell for cell in self.free_pit_cells if rng.random() < self.p)
+        return pits
+
+    def choose_count(self, rng, total, rest, remaining):
+        weights = [coefficient(total, j) * coefficient(rest, remaining - j) for j in range(remaining + 1)]
+        target = rng.random() * sum(weights)
+        for j, w in enumerate(weights):
+            target -= w
+            if target < 0:
+                return j
+        return remaining
+
+    def sample_wumpuses(self, rng, pits, layout):
+        wumpuses = set(self.known_wumpuses)
+        if self.alive == 0 or not self.wumpus_cells:
+            return wumpuses
+        if layout is None:
+            # Contradictory percepts: any pit-free cells will do.
+            cells = [cell for cell in self.wumpus_cells if cell not in pits]
+            wumpuses.update(rng.sample(cells, min(self.alive, len(cells))))
+            return wumpuses
+
+        components, free_cells, totals, suffix = layout
+        remaining = self.alive
+        for i, component in enumerate(components):
+            count = self.choose_count(rng, totals[i], suffix[i + 1], remaining)
+            remaining -= count
+            placed, free = self.sample_component(
+                component, rng, lambda poly, n: coefficient(poly, count))
+            wumpuses.update(placed)
+            wumpuses.update(rng.sample(free, count - len(placed)))
+        wumpuses.update(rng.sample(free_cells, remaining))
+        return wumpuses
+
+    def sample(self, rng):
+        # Wumpuses are drawn given the pits, on pit-free cells only; pits
+        # that leave no room for them are drawn again.
+        layout = None
+        for _ in range(self.MAX_PIT_TRIES):
+            pits = self.sample_pits(rng)
+            if not self.wumpuses_placeable:
+                break
+            layout = self.layout_without(pits)
+            if layout is not None:
+                break
+        wumpuses = self.sample_wumpuses(rng, pits, layout)
+        candidates = [cell for cell in self.gold_cells if cell not in pits and cell not in wumpuses]
+        gold = rng.choice(candidates) if candidates else None
+        return World(frozenset(pits), frozenset(wumpuses), gold)
+
+def sample_chunk(model, count, seed):
+    rng = random.Random(seed)
+    return [model.sample(rng) for _ in range(count)]
+
+class WorldSampler:
+    # Draws complete worlds consistent with the knowledge base, so actions
+    # can be scored across them. Each frontier component is filled with its
+    # exact conditional distribution instead of rejection sampling from the
+    # generator.
+    def __init__(self, probability_engine):
+        self.engine = probability_engine
+        self.kb = probability_engine.kb
+        self.model = None
+        self.kb.add_listener(self.on_fact_changed)
+
+    def on_fact_changed(self, name, x, y, added):
+        self.model = None
+
+    def gold_cells(self):
+        glitter = list(self.kb.iter_facts_of("glitter"))
+        if glitter:
+            return glitter
+        return [(x, y) for y in range(self.kb.N) for x in range(self.kb.N) if (x, y) not in self.kb.visited]
+
+    def current_model(self):
+        # Rebuilt when the knowledge base or the wumpus count changes.
+        key = self.engine.wumpuses_killed
+        if self.model is None or self.model_key != key:
+            self.model = WorldModel(self.engine.p, self.engine.pit_constraints(),
+                                    self.engine.wumpus_constraints(), self.gold_cells())
+            self.model_key = key
+        return self.model
+
+    def sample(self, count, seed=None, workers=1):
+        model = self.current_model()
+        if workers <= 1:
+            return sample_chunk(model, count, seed)
+
+        # Every worker gets its own seed, derived from seed, so a run is
+        # reproducible for a fixed worker count.
+        seeder = random.Random(seed)
+        seeds = [seeder.getrandbits(64) for _ in range(workers)]
+        sizes = [count // workers + (1 if i < count % workers else 0) for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = pool.map(sample_chunk, [model] * workers, sizes, seeds)
+            return [world for chunk in chunks for world in chunk]
+
+    def expected_scores(self, worlds, x, y, direction, has_gold, actions):
+        # Mean immediate score change of each action over the sampled worlds.
+        nx, ny = x + DX[direction], y + DY[direction]
+        inside = 0 <= nx < self.kb.N and 0 <= ny < self.kb.N
+        scores = {}
+        for action in actions:
+            total = 0
+            for world in worlds:
+                if action == "FORWARD":
+                    total += -1 - (1000 if inside and world.is_deadly(nx, ny) else 0)
+                elif action in ("LEFT", "RIGHT"):
+                    total -= 1
+                elif action == "SHOOT":
+                    total -= 10
+                elif action == "GRAB":
+                    total += 10 if not has_gold and world.gold == (x, y) else 0
+                elif action == "CLIMB":
+                    total += 1000 if has_gold and (x, y) == (0, 0) else 0
+            scores[action] = total / len(worlds) if worlds else 0.0
+        return scores